@@ -1,2 +1,5 @@
 # flake8: noqa
 from .core import JsonValue, valuetypes, CustomValueType, CustomNodeType
+from .stats import Stats, Metrics
+from .cache import ResultCache
+from .limits import Limits
@@ -0,0 +1,59 @@
+"""Convert a newline delimited JSON file in parallel.
+
+Run ``python -m jsonvalue --help`` for usage.
+"""
+import argparse
+import sys
+
+from .parallel import convert_path, resolve
+from .error import LineError
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m jsonvalue',
+        description="Convert a newline delimited JSON file, loading and "
+        "dumping each line again.")
+    parser.add_argument('input', help="the file to convert")
+    parser.add_argument('output', help="the file to write")
+    parser.add_argument(
+        '--factory', required=True,
+        help="module:name of a function that returns a JsonValue")
+    parser.add_argument(
+        '--load-context', help="module:name of the context to load with")
+    parser.add_argument(
+        '--dump-context',
+        help="module:name of the context to dump with, by default the "
+        "load context")
+    parser.add_argument(
+        '-j', '--processes', type=int,
+        help="the amount of processes, by default the amount of CPUs")
+    parser.add_argument(
+        '--shards', type=int,
+        help="the amount of shards, by default the amount of processes")
+    parser.add_argument(
+        '--no-merge', dest='merge', action='store_false',
+        help="leave each shard in its own output file")
+    parser.add_argument(
+        '--dead-letter',
+        help="write lines that cannot be converted to this file and "
+        "continue")
+    args = parser.parse_args(argv)
+    load_context = dump_context = None
+    if args.load_context is not None:
+        load_context = resolve(args.load_context)
+    if args.dump_context is not None:
+        dump_context = resolve(args.dump_context)
+    try:
+        convert_path(args.factory, args.input, args.output,
+                     load_context=load_context, dump_context=dump_context,
+                     processes=args.processes, shards=args.shards,
+                     merge=args.merge, dead_letter=args.dead_letter)
+    except LineError, e:
+        sys.stderr.write('%s: %s\n' % (args.input, e))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,191 @@
+import copy
+import hashlib
+import threading
+import weakref
+from collections import OrderedDict
+
+
+class ResultCache(object):
+    """Bounded cache of load results, keyed by a hash of the input.
+
+    Pass an instance as the ``result_cache`` argument of
+    :class:`jsonvalue.JsonValue` to have ``loads`` return earlier
+    results for input it has seen before with the same context.
+
+    ``maxsize`` is the maximum amount of cached results; the least
+    recently used result is evicted first. If ``copy`` is true (the
+    default) each caller gets a deep copy of the cached result, so it
+    may change it freely. If ``copy`` is false all callers share the
+    same result, which is faster but means nobody may change it.
+
+    Each result records the type IRIs it depends on, so that
+    registering a type only invalidates the results it affects.
+    """
+    def __init__(self, maxsize=128, copy=True):
+        self.maxsize = maxsize
+        self.copy = copy
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        # key -> (result, dependencies)
+        self._results = OrderedDict()
+        # dependency -> set of keys
+        self._dependents = {}
+
+    def key(self, s, context_key, reject_unknown):
+        if isinstance(s, unicode):
+            s = s.encode('utf-8')
+        h = hashlib.sha1(s)
+        h.update(context_key)
+        h.update(reject_unknown and '1' or '0')
+        return h.digest()
+
+    def get(self, key):
+        """Return cached result for key, or ``None``.
+        """
+        with self._lock:
+            entry = self._results.pop(key, None)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            # move to the end, as it is now the most recently used
+            self._results[key] = entry
+        return self._hand_out(entry[0])
+
+    def put(self, key, result, dependencies=()):
+        """Cache result under key, returning what the caller should use.
+
+        ``dependencies`` are the type IRIs the result depends on.
+        """
+        with self._lock:
+            self._remove(key)
+            self._results[key] = result, dependencies
+            for dependency in dependencies:
+                self._dependents.setdefault(dependency, set()).add(key)
+            while len(self._results) > self.maxsize:
+                self._remove(next(iter(self._results)))
+                self.evictions += 1
+        return self._hand_out(result)
+
+    def invalidate(self, dependency):
+        """Remove all results that depend on dependency.
+        """
+        with self._lock:
+            for key in self._dependents.pop(dependency, ()):
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+            self._dependents.clear()
+
+    def info(self):
+        """Return a dict with hit, miss and eviction counts and size.
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size': len(self._results),
+                'maxsize': self.maxsize,
+            }
+
+    def __len__(self):
+        return len(self._results)
+
+    def _hand_out(self, result):
+        if self.copy:
+            return copy.deepcopy(result)
+        return result
+
+    def _remove(self, key):
+        entry = self._results.pop(key, None)
+        if entry is None:
+            return
+        for dependency in entry[1]:
+            keys = self._dependents.get(dependency)
+            if keys is None:
+                continue
+            keys.discard(key)
+            if not keys:
+                del self._dependents[dependency]
+
+
+class DumpCache(object):
+    """Dumped form of objects, keyed by object identity.
+
+    Entries are removed when their object is garbage collected. Each
+    entry records the classes of the objects that were dumped to
+    create it, so that registering a node type for a class only
+    invalidates the entries it affects.
+    """
+    def __init__(self):
+        # reentrant, as garbage collection can trigger removal while
+        # we hold the lock
+        self._lock = threading.RLock()
+        # id(obj) -> (weak reference to obj, dumped, classes)
+        self._entries = {}
+        # class -> set of ids
+        self._dependents = {}
+
+    def get(self, obj):
+        """Return ``(dumped, classes)`` for obj, or ``None``.
+        """
+        entry = self._entries.get(id(obj))
+        if entry is None or entry[0]() is not obj:
+            return None
+        return entry[1], entry[2]
+
+    def put(self, obj, dumped, classes):
+        key = id(obj)
+
+        def remove(ref):
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] is ref:
+                    self._remove(key)
+        try:
+            ref = weakref.ref(obj, remove)
+        except TypeError:
+            # not weakly referenceable, so we cannot cache it
+            return
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = ref, dumped, classes
+            for cls in classes:
+                self._dependents.setdefault(cls, set()).add(key)
+
+    def invalidate(self, obj=None):
+        """Remove the entry for obj, or all entries.
+        """
+        with self._lock:
+            if obj is None:
+                self._entries.clear()
+                self._dependents.clear()
+            else:
+                self._remove(id(obj))
+
+    def invalidate_class(self, cls):
+        """Remove all entries that depend on cls.
+        """
+        with self._lock:
+            for key in self._dependents.pop(cls, ()):
+                self._remove(key)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for cls in entry[2]:
+            keys = self._dependents.get(cls)
+            if keys is None:
+                continue
+            keys.discard(key)
+            if not keys:
+                del self._dependents[cls]
@@ -0,0 +1,325 @@
+"""A small CBOR (RFC 7049) encoder and decoder.
+
+It handles what JSON handles, plus dates and datetimes as tagged
+values: a date is tag 100, the days since the epoch (RFC 8943), and a
+datetime is tag 1, the seconds since the epoch. Datetimes without a
+timezone are taken to be in UTC and are decoded without a timezone
+again. A datetime with a timezone is encoded as tag 0, a string, so
+its UTC offset is kept.
+"""
+import struct
+from datetime import date, datetime, timedelta
+
+from .error import DepthError
+from .lazy import LazyModule
+
+isodate = LazyModule('isodate')
+
+# the Python types encoded as tagged values
+NATIVE = (date, datetime)
+
+EPOCH = datetime(1970, 1, 1)
+EPOCH_DATE = EPOCH.date()
+
+TAG_DATETIME_STRING = 0
+TAG_EPOCH = 1
+TAG_POSITIVE_BIGNUM = 2
+TAG_NEGATIVE_BIGNUM = 3
+TAG_EPOCH_DAYS = 100
+
+BREAK = object()
+
+
+def dumps(obj):
+    """Return the CBOR encoding of obj as a string.
+    """
+    out = []
+    encode(obj, out.append)
+    return ''.join(out)
+
+
+def head(major, n):
+    """Return the initial bytes of an item with major type and argument n.
+    """
+    major <<= 5
+    if n < 24:
+        return chr(major | n)
+    if n < 0x100:
+        return struct.pack('>BB', major | 24, n)
+    if n < 0x10000:
+        return struct.pack('>BH', major | 25, n)
+    if n < 0x100000000:
+        return struct.pack('>BI', major | 26, n)
+    return struct.pack('>BQ', major | 27, n)
+
+
+def encode(obj, write):
+    # XXX recursive, but what we encode has been through dump_objects,
+    # which limits the depth
+    cls = obj.__class__
+    if cls is unicode:
+        s = obj.encode('utf-8')
+        write(head(3, len(s)))
+        write(s)
+    elif cls is str:
+        # like the json module we take str to be UTF-8 text
+        write(head(3, len(obj)))
+        write(obj)
+    elif obj is None:
+        write('\xf6')
+    elif obj is True:
+        write('\xf5')
+    elif obj is False:
+        write('\xf4')
+    elif isinstance(obj, (int, long)):
+        encode_integer(obj, write)
+    elif isinstance(obj, float):
+        write(struct.pack('>Bd', 0xfb, obj))
+    elif isinstance(obj, dict):
+        write(head(5, len(obj)))
+        for key, value in obj.iteritems():
+            encode(key, write)
+            encode(value, write)
+    elif isinstance(obj, (list, tuple)):
+        write(head(4, len(obj)))
+        for value in obj:
+            encode(value, write)
+    elif isinstance(obj, datetime):
+        if obj.tzinfo is not None:
+            write(head(6, TAG_DATETIME_STRING))
+            encode(isodate.datetime_isoformat(obj), write)
+            return
+        delta = obj - EPOCH
+        seconds = delta.days * 86400 + delta.seconds
+        write(head(6, TAG_EPOCH))
+        if delta.microseconds:
+            encode(seconds + delta.microseconds / 1e6, write)
+        else:
+            encode(seconds, write)
+    elif isinstance(obj, date):
+        write(head(6, TAG_EPOCH_DAYS))
+        encode((obj - EPOCH_DATE).days, write)
+    else:
+        raise TypeError("%r is not CBOR serializable" % obj)
+
+
+def encode_integer(n, write):
+    if n >= 0:
+        major, n = 0, n
+    else:
+        major, n = 1, -1 - n
+    if n < 0x10000000000000000:
+        write(head(major, n))
+        return
+    data = []
+    while n:
+        data.append(chr(n & 0xff))
+        n >>= 8
+    data.reverse()
+    write(head(6, TAG_POSITIVE_BIGNUM if major == 0 else TAG_NEGATIVE_BIGNUM))
+    write(head(2, len(data)))
+    write(''.join(data))
+
+
+def loads(s, max_depth=float('inf')):
+    """Decode the CBOR item in string s.
+
+    Raises ``ValueError`` for input that is not valid CBOR, and
+    :class:`jsonvalue.error.DepthError` if arrays, maps and tags are
+    nested deeper than ``max_depth``.
+    """
+    decoder = Decoder(s, max_depth)
+    result = decoder.decode(0)
+    if result is BREAK:
+        raise ValueError("Unexpected break at offset 0")
+    if decoder.pos != len(s):
+        raise ValueError("Extra data at offset %s" % decoder.pos)
+    return result
+
+
+class Decoder(object):
+    def __init__(self, s, max_depth):
+        self.s = s
+        self.pos = 0
+        self.max_depth = max_depth
+
+    def read(self, n):
+        pos = self.pos
+        end = pos + n
+        if end > len(self.s):
+            raise ValueError("Unexpected end of data at offset %s" % pos)
+        self.pos = end
+        return self.s[pos:end]
+
+    def argument(self, info):
+        if info < 24:
+            return info
+        if info == 24:
+            return ord(self.read(1))
+        if info == 25:
+            return struct.unpack('>H', self.read(2))[0]
+        if info == 26:
+            return struct.unpack('>I', self.read(4))[0]
+        if info == 27:
+            return struct.unpack('>Q', self.read(8))[0]
+        if info == 31:
+            # indefinite length
+            return None
+        raise ValueError("Invalid additional information %s at offset %s" %
+                         (info, self.pos - 1))
+
+    def decode(self, depth):
+        # tags are read in a loop rather than by recursion, but count
+        # toward the depth; a tagged value may be one level deeper than
+        # a container, so what dumpb writes at max_depth loads again
+        tags = []
+        while True:
+            initial = ord(self.read(1))
+            major = initial >> 5
+            info = initial & 0x1f
+            if major != 6:
+                break
+            tag = self.argument(info)
+            if tag is None:
+                raise ValueError("Invalid indefinite length at offset %s" %
+                                 (self.pos - 1))
+            if depth > self.max_depth:
+                raise DepthError(self.max_depth)
+            depth += 1
+            tags.append(tag)
+        value = self.untagged(major, info, depth)
+        if tags:
+            if value is BREAK:
+                raise ValueError("Unexpected break at offset %s" %
+                                 (self.pos - 1))
+            for tag in reversed(tags):
+                value = self.tagged(tag, value)
+        return value
+
+    def untagged(self, major, info, depth):
+        if major == 7:
+            return self.simple(info)
+        n = self.argument(info)
+        if n is None and major in (0, 1):
+            raise ValueError("Invalid indefinite length at offset %s" %
+                             (self.pos - 1))
+        if major == 0:
+            return n
+        if major == 1:
+            return -1 - n
+        if major == 2 or major == 3:
+            if n is None:
+                chunk_type = str if major == 2 else unicode
+                chunks = []
+                while True:
+                    start = self.pos
+                    chunk = self.decode(depth)
+                    if chunk is BREAK:
+                        break
+                    if chunk.__class__ is not chunk_type:
+                        raise ValueError("Invalid string chunk at offset %s" %
+                                         start)
+                    chunks.append(chunk)
+                s = ''.join(chunks) if major == 2 else u''.join(chunks)
+            else:
+                s = self.read(n)
+                if major == 3:
+                    s = s.decode('utf-8')
+            return s
+        if depth >= self.max_depth:
+            raise DepthError(self.max_depth)
+        depth += 1
+        if major == 4:
+            result = []
+            if n is None:
+                while True:
+                    value = self.decode(depth)
+                    if value is BREAK:
+                        return result
+                    result.append(value)
+            for i in xrange(n):
+                result.append(self.item(depth))
+            return result
+        result = {}
+        if n is None:
+            while True:
+                start = self.pos
+                key = self.decode(depth)
+                if key is BREAK:
+                    return result
+                self.check_key(key, start)
+                result[key] = self.item(depth)
+        for i in xrange(n):
+            start = self.pos
+            key = self.item(depth)
+            self.check_key(key, start)
+            result[key] = self.item(depth)
+        return result
+
+    def check_key(self, key, start):
+        # the only values we decode that cannot be dict keys
+        if isinstance(key, (list, dict)):
+            raise ValueError("Invalid map key at offset %s" % start)
+
+    def item(self, depth):
+        value = self.decode(depth)
+        if value is BREAK:
+            raise ValueError("Unexpected break at offset %s" % (self.pos - 1))
+        return value
+
+    def simple(self, info):
+        if info == 20:
+            return False
+        if info == 21:
+            return True
+        if info == 22 or info == 23:
+            return None
+        if info == 25:
+            return half_float(struct.unpack('>H', self.read(2))[0])
+        if info == 26:
+            return struct.unpack('>f', self.read(4))[0]
+        if info == 27:
+            return struct.unpack('>d', self.read(8))[0]
+        if info == 31:
+            return BREAK
+        raise ValueError("Unsupported simple value %s at offset %s" %
+                         (info, self.pos - 1))
+
+    def tagged(self, tag, value):
+        if tag == TAG_EPOCH:
+            if not isinstance(value, (int, long, float)):
+                raise ValueError("Invalid epoch datetime %r" % value)
+            try:
+                return EPOCH + timedelta(seconds=value)
+            except OverflowError:
+                raise ValueError("Epoch datetime %r out of range" % value)
+        if tag == TAG_EPOCH_DAYS:
+            if not isinstance(value, (int, long)):
+                raise ValueError("Invalid epoch date %r" % value)
+            try:
+                return EPOCH_DATE + timedelta(days=value)
+            except OverflowError:
+                raise ValueError("Epoch date %r out of range" % value)
+        if tag == TAG_DATETIME_STRING:
+            if not isinstance(value, basestring):
+                raise ValueError("Invalid datetime string %r" % value)
+            return isodate.parse_datetime(value)
+        if tag == TAG_POSITIVE_BIGNUM or tag == TAG_NEGATIVE_BIGNUM:
+            if not isinstance(value, str):
+                raise ValueError("Invalid bignum %r" % value)
+            n = long(value.encode('hex') or '0', 16)
+            return n if tag == TAG_POSITIVE_BIGNUM else -1 - n
+        # we do not know other tags, so we keep just the value
+        return value
+
+
+def half_float(h):
+    exponent = (h >> 10) & 0x1f
+    mantissa = h & 0x3ff
+    if exponent == 0:
+        value = mantissa * 2.0 ** -24
+    elif exponent == 31:
+        value = float('nan') if mantissa else float('inf')
+    else:
+        value = (mantissa + 1024) * 2.0 ** (exponent - 25)
+    return -value if h & 0x8000 else value
@@ -0,0 +1,175 @@
+"""Streaming gzip and bz2 compression for load and dump.
+
+Compressed input is recognized by its magic bytes and decompressed a
+chunk at a time while it is read, so it is never decompressed as a
+whole before loading starts.
+"""
+import bz2
+import io
+import zlib
+
+CHUNK_SIZE = 64 * 1024
+
+MAGIC = [
+    ('\x1f\x8b', 'gzip'),
+    ('BZh', 'bz2'),
+]
+
+# enough to recognize any of the formats
+MAGIC_SIZE = max(len(magic) for magic, format in MAGIC)
+
+
+def detect(data):
+    """Return the compression format that data starts with, or ``None``.
+
+    Only a ``str`` can be compressed; text is never.
+    """
+    if not isinstance(data, str):
+        return None
+    for magic, format in MAGIC:
+        if data.startswith(magic):
+            return format
+    return None
+
+
+def decompressor(format):
+    if format == 'gzip':
+        # 16 makes zlib expect a gzip header and trailer
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    return bz2.BZ2Decompressor()
+
+
+def compressor(format):
+    if format == 'gzip':
+        return zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED,
+                                16 + zlib.MAX_WBITS)
+    if format == 'bz2':
+        return bz2.BZ2Compressor()
+    raise ValueError("Unknown compression format: %r" % format)
+
+
+def open_input(fp):
+    """Return fp, or a reader of its decompressed data if compressed.
+
+    This reads the first few bytes of fp. If fp is not compressed
+    they are put back by seeking, or if fp cannot seek, by returning
+    a reader that has them. Text streams are never compressed, so they
+    are returned as they are.
+    """
+    if isinstance(fp, io.TextIOBase):
+        return fp
+    data = fp.read(MAGIC_SIZE)
+    format = detect(data)
+    if format is not None:
+        return DecompressingReader(fp, format, data)
+    try:
+        fp.seek(-len(data), 1)
+    except (AttributeError, IOError):
+        return DecompressingReader(fp, None, data)
+    return fp
+
+
+class DecompressingReader(object):
+    """A read-only file of the decompressed data in fp.
+
+    Concatenated streams are decompressed one after the other, like
+    gzip and bzip2 do. With format ``None`` the data is passed through
+    as it is. ``data`` is what was read from fp already.
+    """
+    def __init__(self, fp, format, data=''):
+        self.fp = fp
+        self.format = format
+        self.decompressor = decompressor(format) if format else None
+        # decompressed data, of which we have read up to pos
+        self.buffer = ''
+        self.pos = 0
+        self._feed(data)
+
+    def _feed(self, data):
+        if self.decompressor is None:
+            self.buffer = self.buffer[self.pos:] + data
+            self.pos = 0
+            return
+        out = []
+        try:
+            while data:
+                try:
+                    out.append(self.decompressor.decompress(data))
+                except EOFError:
+                    # bz2 after the end of a stream, the next one starts
+                    self.decompressor = decompressor(self.format)
+                    continue
+                data = self.decompressor.unused_data
+                if data:
+                    self.decompressor = decompressor(self.format)
+        except (zlib.error, IOError), e:
+            raise ValueError("Invalid %s data: %s" % (self.format, e))
+        self.buffer = self.buffer[self.pos:] + ''.join(out)
+        self.pos = 0
+
+    def _fill(self):
+        """Decompress more data into the buffer.
+
+        Returns ``False`` at the end of the input.
+        """
+        data = self.fp.read(CHUNK_SIZE)
+        if not data:
+            return False
+        self._feed(data)
+        return True
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            chunks = [self.buffer[self.pos:]]
+            self.buffer = ''
+            self.pos = 0
+            while self._fill():
+                chunks.append(self.buffer)
+                self.buffer = ''
+            return ''.join(chunks)
+        while len(self.buffer) - self.pos < size and self._fill():
+            pass
+        result = self.buffer[self.pos:self.pos + size]
+        self.pos += len(result)
+        return result
+
+    def readline(self):
+        end = self.buffer.find('\n', self.pos)
+        while end == -1:
+            searched = len(self.buffer) - self.pos
+            if not self._fill():
+                end = len(self.buffer)
+                break
+            end = self.buffer.find('\n', searched)
+        else:
+            end += 1
+        line = self.buffer[self.pos:end]
+        self.pos = end
+        return line
+
+    def __iter__(self):
+        while True:
+            line = self.readline()
+            if not line:
+                return
+            yield line
+
+
+class CompressingWriter(object):
+    """A write-only file that compresses what is written into fp.
+
+    Call :meth:`finish` after the last write; this does not close fp.
+    """
+    def __init__(self, fp, format):
+        self.fp = fp
+        self.compressor = compressor(format)
+
+    def write(self, data):
+        if isinstance(data, unicode):
+            data = data.encode('utf-8')
+        data = self.compressor.compress(data)
+        if data:
+            self.fp.write(data)
+
+    def finish(self):
+        self.fp.write(self.compressor.flush())
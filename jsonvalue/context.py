@@ -0,0 +1,105 @@
+import copy
+import json
+import threading
+import weakref
+
+
+class CompiledContext(object):
+    """A JSON-LD context analyzed once.
+
+    A compiled context does not depend on registered types, so it can
+    be shared by all :class:`jsonvalue.JsonValue` instances.
+
+    ``key`` is a canonical JSON serialization of the context. If the
+    context only consists of plain term definitions (a term mapped to
+    an absolute IRI, optionally with a type), ``simple`` is true and
+    ``terms`` maps each term to a tuple of IRI and type IRI (``None``
+    if the term has no type). ``type_iris`` contains all type IRIs the
+    context refers to.
+    """
+    def __init__(self, context, key):
+        # our own copy, as the compiled context is shared
+        context = self.context = copy.deepcopy(context)
+        self.key = key
+        self.terms = {}
+        self.simple = True
+        self.type_iris = frozenset()
+        if context is None:
+            return
+        if not isinstance(context, dict):
+            # a remote context or a list of contexts
+            self.simple = False
+            return
+        type_iris = set()
+        for term, definition in context.items():
+            if isinstance(definition, dict):
+                type = definition.get('@type')
+                if type is not None:
+                    type_iris.add(type)
+            parsed = parse_definition(context, term, definition)
+            if parsed is None:
+                self.simple = False
+                continue
+            self.terms[term] = parsed
+        self.type_iris = frozenset(type_iris)
+
+
+def parse_definition(context, term, definition):
+    """Parse a plain term definition into a tuple of IRI and type.
+
+    Returns ``None`` for anything that is not a plain definition.
+    """
+    if term.startswith('@') or ':' in term:
+        return None
+    type = None
+    if isinstance(definition, dict):
+        if set(definition) - set(['@id', '@type']):
+            return None
+        iri = definition.get('@id')
+        type = definition.get('@type')
+        if type is not None and (type.startswith('@') or
+                                 not is_absolute(context, type)):
+            return None
+    else:
+        iri = definition
+    if not isinstance(iri, basestring) or not is_absolute(context, iri):
+        return None
+    return iri, type
+
+
+def is_absolute(context, iri):
+    prefix, sep, suffix = iri.partition(':')
+    # a compact IRI uses a term of the context as its prefix
+    return bool(sep) and prefix not in context and not prefix.startswith('@')
+
+
+def context_key(context):
+    return json.dumps(context, sort_keys=True)
+
+
+class ContextStore(object):
+    """Process-wide store of compiled contexts, keyed by content.
+
+    A compiled context stays in the store for as long as something
+    refers to it; JsonValue instances keep references to the contexts
+    they use. Memory therefore grows with the amount of distinct
+    contexts, not with the amount of JsonValue instances.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._compiled = weakref.WeakValueDictionary()
+
+    def get(self, context, key=None):
+        if key is None:
+            key = context_key(context)
+        with self._lock:
+            compiled = self._compiled.get(key)
+            if compiled is None:
+                compiled = self._compiled[key] = CompiledContext(context, key)
+        return compiled
+
+    def __len__(self):
+        return len(self._compiled)
+
+
+store = ContextStore()
@@ -1,35 +1,264 @@
-from pyld import jsonld
 import json
+import mmap
+import os
+from itertools import groupby
+from operator import itemgetter
 from types import NoneType
 
-from .error import ValueLoadError, LoadError, ValueDumpError, DumpError
+from .error import (ValueLoadError, LoadError, ValueDumpError, DumpError,
+                    FrozenError, DepthError)
+from .stats import NULL_STATS
+from .cache import DumpCache
+from .context import context_key, store as context_store
+from .specialize import Unspecialized, store as loader_store
+from .lazy import LazyModule
+from .vocabulary import LazyVocabulary
+from .deadletter import dead_letter_sink
+from . import cbor
+from .compress import (open_input, detect, MAGIC_SIZE, DecompressingReader,
+                       CompressingWriter)
+
+# imported on first use, as this takes longer than the rest of jsonvalue
+jsonld = LazyModule('pyld.jsonld')
+
+# the maximum amount of compiled contexts a JsonValue holds on to
+MAX_CONTEXTS = 256
+# the default maximum nesting depth of documents and objects
+MAX_DEPTH = 100
+JSON_SCALARS = frozenset([str, unicode, int, long, float, bool, NoneType])
+# the classes json serializes, subclasses included
+JSON_ENCODED = (dict, list, tuple, basestring, int, long, float)
 
 
 class JsonValue(object):
-    def __init__(self):
+    def __init__(self, metrics=None, result_cache=None, max_depth=MAX_DEPTH):
         self._iri_to_value_type = {}
         self._iri_to_node_type = {}
         self._class_to_node_type = {}
+        self.metrics = metrics
+        self.result_cache = result_cache
+        # load and dump raise DepthError for anything nested deeper
+        self.max_depth = max_depth
+        self._dump_cache = DumpCache()
+        # compiled contexts in use, shared with other instances
+        self._contexts = {}
+        # the same by id() of the context, which we hold on to so the
+        # id is not reused
+        self._context_ids = {}
+        # specialized loaders by context key
+        self._loaders = {}
+        # lazy vocabularies, consulted for types not registered yet
+        self._value_vocabularies = []
+        self._node_vocabularies = []
+        # registered contexts by URL, and their URLs by context key
+        self._context_urls = {}
+        self._context_references = {}
+        # whether json would serialize objects of a node type itself
+        self._json_encodes_nodes = False
 
     def value_type(self, iri, type):
         self._iri_to_value_type[iri] = type
+        self._registry_changed(iri)
 
     def node_type(self, iri, type):
         self._iri_to_node_type[iri] = type
         # XXX use reg for this
         self._class_to_node_type[type.cls] = type
+        if issubclass(type.cls, JSON_ENCODED):
+            self._json_encodes_nodes = True
+        self._registry_changed(iri, type.cls)
+
+    def context_url(self, url, context):
+        """Register context under url.
+
+        A document with url as its ``@context`` is then loaded with
+        context, without retrieving url, and url can be passed wherever
+        a context is expected. With ``reference_context`` dump puts url
+        in the output instead of context.
+        """
+        self._context_urls[url] = context
+        self._context_references[self.compile_context(context).key] = url
+
+    def resolve_context(self, context):
+        """Return the context registered under URL context.
+
+        Any other context is returned as it is.
+        """
+        if isinstance(context, basestring):
+            return self._context_urls.get(context, context)
+        return context
+
+    def context_reference(self, context):
+        """Return the URL context is registered under.
+
+        Raises ``ValueError`` if it is not registered.
+        """
+        url = self._context_references.get(
+            self.compile_context(self.resolve_context(context)).key)
+        if url is None:
+            raise ValueError("No URL registered for context")
+        return url
+
+    def _load_document(self, url, options=None):
+        # document loader for pyld, so contexts it finds by URL in a
+        # document are the registered ones
+        context = self._context_urls.get(url)
+        if context is None:
+            return jsonld.get_document_loader()(url)
+        return {
+            'contextUrl': None,
+            'documentUrl': url,
+            'document': {'@context': context},
+        }
+
+    def jsonld_options(self, **options):
+        """Return options for pyld with those given.
+        """
+        if self._context_urls:
+            options['documentLoader'] = self._load_document
+        return options
+
+    def _registry_changed(self, iri, cls=None):
+        # only throw away what depends on the changed registration
+        if self.result_cache is not None:
+            self.result_cache.invalidate(iri)
+        if cls is not None:
+            self._dump_cache.invalidate_class(cls)
+        for key, loader in self._loaders.items():
+            if loader is not None and iri in loader.type_iris:
+                del self._loaders[key]
 
     def value_vocabulary(self, types):
+        """Register value types.
+
+        ``types`` is a dict that maps type IRI to value type, or a
+        :class:`jsonvalue.vocabulary.LazyVocabulary`. The types in a
+        lazy vocabulary are only created and registered when they are
+        first looked up.
+        """
+        if isinstance(types, LazyVocabulary):
+            self._value_vocabularies.append(types)
+            self._vocabulary_added()
+            return
         for iri, type in types.items():
             self.value_type(iri, type)
 
+    def node_vocabulary(self, types):
+        """Register node types.
+
+        Like :meth:`value_vocabulary`, but for node types.
+        """
+        if isinstance(types, LazyVocabulary):
+            self._node_vocabularies.append(types)
+            self._vocabulary_added()
+            return
+        for iri, type in types.items():
+            self.node_type(iri, type)
+
+    def _vocabulary_added(self):
+        # we cannot tell which types it affects
+        if self.result_cache is not None:
+            self.result_cache.clear()
+        self._dump_cache.invalidate()
+        self._loaders.clear()
+
+    def _lazy_value_type(self, iri):
+        for vocabulary in self._value_vocabularies:
+            t = vocabulary.get(iri)
+            if t is not None:
+                self.value_type(iri, t)
+                return t
+        return None
+
+    def _lazy_node_type(self, iri):
+        for vocabulary in self._node_vocabularies:
+            t = vocabulary.get(iri)
+            if t is not None:
+                self.node_type(iri, t)
+                return t
+        return None
+
+    def _lazy_node_type_for_class(self, cls):
+        for vocabulary in self._node_vocabularies:
+            entry = vocabulary.get_for_class(cls)
+            if entry is not None:
+                self.node_type(*entry)
+                return entry[1]
+        return None
+
+    def compile_context(self, context):
+        """Return the :class:`jsonvalue.context.CompiledContext`.
+
+        Compiled contexts are shared by all JsonValue instances in the
+        process.
+        """
+        # a context we have seen is compared with the copy the compiled
+        # context has, which is much faster than serializing it, and
+        # notices a context that was changed in place since
+        entry = self._context_ids.get(id(context))
+        if entry is not None and entry[1].context == context:
+            return entry[1]
+        key = context_key(context)
+        compiled = self._contexts.get(key)
+        if compiled is None:
+            compiled = context_store.get(context, key)
+            if len(self._contexts) >= MAX_CONTEXTS:
+                self._contexts.clear()
+            self._contexts[key] = compiled
+        if len(self._context_ids) >= MAX_CONTEXTS:
+            self._context_ids.clear()
+        self._context_ids[id(context)] = context, compiled
+        return compiled
+
+    def specialized_loader(self, context):
+        """Return the specialized loader for context.
+
+        Returns a :class:`jsonvalue.specialize.SpecializedLoader`, or
+        ``None`` if the context cannot be specialized.
+        """
+        compiled = self.compile_context(context)
+        try:
+            return self._loaders[compiled.key]
+        except KeyError:
+            pass
+        if self._value_vocabularies:
+            # the loader inlines the value types, so they must be known
+            for iri in compiled.type_iris:
+                self.can_load_value(iri)
+        loader = loader_store.get(compiled, self._iri_to_value_type)
+        if len(self._loaders) >= MAX_CONTEXTS:
+            self._loaders.clear()
+        self._loaders[compiled.key] = loader
+        return loader
+
+    def freeze(self, result_cache=None):
+        """Return a frozen copy of this JsonValue.
+
+        The frozen copy has the types registered so far compiled into
+        flat dispatch tables. No types can be registered on it, so it
+        can be shared between threads without locking. The copy shares
+        ``metrics`` with this JsonValue; it can have its own
+        ``result_cache``.
+        """
+        return FrozenJsonValue(self, result_cache)
+
     def can_load_value(self, id):
-        return id in self._iri_to_value_type
+        return (id in self._iri_to_value_type or
+                (bool(self._value_vocabularies) and
+                 self._lazy_value_type(id) is not None))
 
     def load_value(self, term, type, value, extra):
         t = self._iri_to_value_type.get(type)
+        if t is None and self._value_vocabularies:
+            t = self._lazy_value_type(type)
         if t is None or value is None:
             return value
+        if self.metrics is not None:
+            return self.metrics.measure('load_value', type, self._load_value,
+                                        t, term, type, value, extra)
+        return self._load_value(t, term, type, value, extra)
+
+    def _load_value(self, t, term, type, value, extra):
         if not t.validate_load(value, extra):
             raise ValueLoadError(term, type, value)
         try:
@@ -42,88 +271,771 @@ class JsonValue(object):
 
     def dump_value(self, term, type, value, extra):
         t = self._iri_to_value_type.get(type)
+        if t is None and self._value_vocabularies:
+            t = self._lazy_value_type(type)
         if t is None or value is None:
             return value
+        if self.metrics is not None:
+            return self.metrics.measure('dump_value', type, self._dump_value,
+                                        t, term, type, value, extra)
+        return self._dump_value(t, term, type, value, extra)
+
+    def _dump_value(self, t, term, type, value, extra):
         if not t.validate_dump(value, extra):
             raise ValueDumpError(term, type, value)
         return t.dump(value, extra)
 
+    def is_loaded_value(self, type, value, extra):
+        """Whether value is what the value type registered for type loads.
+        """
+        t = self._iri_to_value_type.get(type)
+        if t is None and self._value_vocabularies:
+            t = self._lazy_value_type(type)
+        return t is not None and t.validate_dump(value, extra)
+
     def can_load_node(self, id):
-        return id in self._iri_to_node_type
+        return (id in self._iri_to_node_type or
+                (bool(self._node_vocabularies) and
+                 self._lazy_node_type(id) is not None))
 
     def load_node(self, id, d, extra):
         t = self._iri_to_node_type[id]
+        if self.metrics is not None:
+            return self.metrics.measure('load_node', id, t.load, d, extra)
         return t.load(d, extra)
 
+    def can_load_many(self, id):
+        return getattr(self._iri_to_node_type[id], 'load_many',
+                       None) is not None
+
+    def load_many(self, id, dicts, extra):
+        """Load a list of nodes of the same type in one go.
+        """
+        load_many = self._iri_to_node_type[id].load_many
+        if self.metrics is not None:
+            return self.metrics.measure('load_many', id, load_many, dicts,
+                                        extra)
+        return load_many(dicts, extra)
+
     def can_dump_node(self, obj):
-        return type(obj) in self._class_to_node_type
+        return (type(obj) in self._class_to_node_type or
+                (bool(self._node_vocabularies) and
+                 self._lazy_node_type_for_class(type(obj)) is not None))
 
     def dump_node(self, obj, extra):
         t = self._class_to_node_type[type(obj)]
-        result = t.dump(obj, extra)
+        if self.metrics is not None:
+            result = self.metrics.measure('dump_node', t.id(), t.dump,
+                                          obj, extra)
+        else:
+            result = t.dump(obj, extra)
         result['@type'] = t.id()
         return result
 
+    def dump_cacheable(self, obj):
+        return getattr(self._class_to_node_type[type(obj)], 'cacheable',
+                       False)
+
+    def cached_dump(self, obj):
+        """Return ``(dumped, classes)`` cached for obj, or ``None``.
+        """
+        return self._dump_cache.get(obj)
+
+    def cache_dump(self, obj, dumped, classes):
+        """Cache the dumped form of obj.
+
+        ``classes`` are the classes of all objects that were dumped to
+        create it. The entry goes away when obj is garbage collected.
+        """
+        self._dump_cache.put(obj, dumped, classes)
+
+    def invalidate_dump(self, obj=None):
+        """Forget the cached dumped form of obj, or of all objects.
+        """
+        self._dump_cache.invalidate(obj)
+
     def load_objects(self, d, context=None, reject_unknown=False,
-                     extra=None):
+                     extra=None, stats=None, inplace=False, types=None,
+                     limits=None, native=None):
         """Take JSON dict, return rich values.
+
+        If a :class:`jsonvalue.stats.Stats` instance is passed as
+        ``stats`` it is filled in with timings and counts.
+
+        With ``inplace`` the conversion does not copy intermediate
+        structures and ``d`` itself is reused for the result: it is
+        emptied once the values have been loaded, and filled with them
+        if the result is a dict. If loading fails ``d`` is left as it
+        was.
+
+        If a set is passed as ``types``, the IRIs of all value and node
+        types found in the input are added to it, whether they are
+        registered or not.
+
+        Raises :class:`jsonvalue.error.DepthError` if ``d`` is nested
+        deeper than ``max_depth``. Pass a :class:`jsonvalue.Limits` as
+        ``limits`` to limit other resources as well.
+
+        ``native`` is a class or tuple of classes of values that may be
+        loaded already, as binary formats can represent them. Such a
+        value is kept as it is if its value type accepts it for
+        dumping.
+
+        If there is nothing to convert, ``d`` itself is returned. This is
+        the case if ``d`` has no ``@type`` anywhere and its context (if
+        any) only has plain term definitions without registered types.
+        ``d`` is then not normalized as JSON-LD processing would: it
+        keeps keys the context does not define, for instance.
         """
         extra = extra or {}
+        if stats is None:
+            stats = NULL_STATS
+        budget = limits.start() if limits is not None else None
         original_context = d.get('@context')
         if context is None:
             context = original_context
+        context = self.resolve_context(context)
+        checked = False
+        if (not reject_unknown and types is None and
+                self._passthrough(context, original_context)):
+            if check_input(d, self._max_depth(budget), budget):
+                return d
+            checked = True
+        # metrics are only recorded by the generic path
+        if self.metrics is None and (
+                original_context is None or
+                self.resolve_context(original_context) == context):
+            result = self._load_specialized(d, context, reject_unknown,
+                                            extra, stats, types, budget,
+                                            native)
+            if result is not None:
+                if original_context is not None:
+                    result['@context'] = original_context
+                if inplace:
+                    d.clear()
+                    d.update(result)
+                    return d
+                return result
+        if not checked:
+            # JSON-LD processing is recursive and cannot be interrupted,
+            # so refuse deep or large input up front
+            check_input(d, self._max_depth(budget), budget)
         wrapped = {
             'http://jsonvalue.org/main': d,
             '@context': context
         }
-        expanded = jsonld.expand(wrapped, dict(expandContext=context))
+        with stats.timer('expand'):
+            expanded = jsonld.expand(
+                wrapped, self.jsonld_options(expandContext=context))
+        if budget is not None:
+            budget.check_time()
         wrapped_objects = LoadTransformer(self, context, reject_unknown,
-                                          extra)(
-            expanded)
+                                          extra, stats, inplace, types,
+                                          budget, native)(expanded)
         result = wrapped_objects['http://jsonvalue.org/main']
         if isinstance(result, dict) and original_context is not None:
             result['@context'] = original_context
+        if inplace:
+            # only now, so that d is intact if loading failed
+            d.clear()
+            if isinstance(result, dict):
+                d.update(result)
+                return d
         return result
 
-    def dump_objects(self, d, context=None, extra=None):
+    def load_expanded(self, expanded, reject_unknown=False, extra=None,
+                      stats=None, inplace=False, types=None, limits=None):
+        """Take expanded JSON-LD, return it with rich values.
+
+        The result stays in expanded form: values are loaded in place in
+        their value objects, and node objects of registered node types
+        are replaced by the loaded objects. ``expanded`` is a list of
+        node objects or a single one. The other arguments are as for
+        :meth:`load_objects`; ``max_depth`` applies to the expanded
+        structure.
+        """
+        extra = extra or {}
+        if stats is None:
+            stats = NULL_STATS
+        budget = limits.start() if limits is not None else None
+        check_input(expanded, self._max_depth(budget), budget)
+        return LoadTransformer(self, None, reject_unknown, extra, stats,
+                               inplace, types, budget).expanded(expanded)
+
+    def _passthrough(self, *contexts):
+        """Whether contexts leave nothing to convert.
+
+        Only an ``@type`` in the document itself can then call for
+        conversion.
+        """
+        for context in contexts:
+            if context is None:
+                continue
+            compiled = self.compile_context(self.resolve_context(context))
+            if not compiled.simple:
+                return False
+            for iri in compiled.type_iris:
+                if self.can_load_value(iri):
+                    return False
+        return True
+
+    def _max_depth(self, budget):
+        if budget is None or budget.max_depth is None:
+            return self.max_depth
+        return budget.max_depth
+
+    def _load_specialized(self, d, context, reject_unknown, extra, stats,
+                          types, budget, native=None):
+        loader = self.specialized_loader(context)
+        if loader is None:
+            return None
+        errors = []
+        try:
+            with stats.timer('specialized'):
+                result = loader(d, extra, errors,
+                                types if types is not None else set(),
+                                reject_unknown, native)
+        except Unspecialized:
+            return None
+        if budget is not None:
+            # a flat document is a single node
+            budget.node()
+            budget.check_errors(errors)
+        if errors:
+            errors.sort(key=lambda err: err.term)
+            raise LoadError(errors)
+        stats.count(1, len(result))
+        return result
+
+    def dump_objects(self, d, context=None, extra=None, stats=None,
+                     inplace=False, references=False, limits=None,
+                     native=None, reference_context=False):
         """Take objects, return plain JSON dict without rich values.
+
+        If a :class:`jsonvalue.stats.Stats` instance is passed as
+        ``stats`` it is filled in with timings and counts.
+
+        With ``inplace`` the conversion does not copy intermediate
+        structures: custom objects in ``d`` are replaced by their dumped
+        form directly.
+
+        With ``references`` an object that occurs more than once is
+        dumped only the first time, with an ``@id``. Later occurrences
+        become references to that ``@id``. This also makes it possible
+        to dump cyclic structures.
+
+        Raises :class:`jsonvalue.error.DepthError` if the dumped
+        structure is nested deeper than ``max_depth``. Pass a
+        :class:`jsonvalue.Limits` as ``limits`` to limit other resources
+        as well.
+
+        ``native`` is a class or tuple of classes of values that are
+        not to be dumped, as binary formats can represent them. Such a
+        value is kept as it is if its value type accepts it.
+
+        With ``reference_context`` the ``@context`` of the result is the
+        URL the context is registered under with :meth:`context_url`,
+        also if ``d`` has no ``@context``.
+
+        Like :meth:`load_objects` this returns ``d`` itself if there is
+        nothing to convert: no custom objects, no ``@type`` and no
+        registered types in the context.
         """
         extra = extra or {}
+        if stats is None:
+            stats = NULL_STATS
+        budget = limits.start() if limits is not None else None
         if isinstance(d, dict):
             original_context = d.get('@context')
         else:
             original_context = None
         if context is None:
             context = original_context
+        context = self.resolve_context(context)
+        if reference_context:
+            original_context = self.context_reference(
+                original_context if original_context is not None
+                else context)
+        if self._passthrough(context, original_context):
+            if check_input(d, self._max_depth(budget), budget):
+                if (reference_context and isinstance(d, dict) and
+                        d.get('@context') != original_context):
+                    d = d.copy()
+                    d['@context'] = original_context
+                return d
+            if budget is not None:
+                # we count the nodes again while dumping
+                budget.nodes = 0
         wrapped = {
             'http://jsonvalue.org/main': d,
             '@context': context
         }
-        result = DumpTransformer(self, context, extra)(wrapped)
-        wrapped_d = jsonld.compact(result, context)
+        result = DumpTransformer(self, context, extra, stats, inplace,
+                                 references, self._max_depth(budget),
+                                 budget, native)(wrapped)
+        with stats.timer('compact'):
+            wrapped_d = jsonld.compact(result, context,
+                                       self.jsonld_options())
+        if budget is not None:
+            budget.check_time()
         result = wrapped_d['http://jsonvalue.org/main']
         if isinstance(result, dict) and original_context is not None:
             result['@context'] = original_context
         return result
 
+    def dump_expanded(self, expanded, context=None, extra=None, stats=None,
+                      inplace=False, references=False, limits=None):
+        """Take expanded JSON-LD with rich values, return plain JSON-LD.
+
+        This is the reverse of :meth:`load_expanded`: values are dumped
+        in their value objects, and custom objects are dumped and
+        expanded with ``context``. The result is in expanded form. The
+        other arguments are as for :meth:`dump_objects`; ``max_depth``
+        applies to the expanded structure.
+        """
+        extra = extra or {}
+        if stats is None:
+            stats = NULL_STATS
+        budget = limits.start() if limits is not None else None
+        context = self.resolve_context(context)
+        return DumpTransformer(self, context, extra, stats, inplace,
+                               references, self._max_depth(budget),
+                               budget).expanded(expanded)
+
     # JSON module style API
-    def dump(self, obj, *args, **kw):
-        return json.dump(self.dump_objects(obj, kw.pop('context', None)),
-                         *args, **kw)
+    def dump(self, obj, fp, *args, **kw):
+        """Dump obj to fp as JSON.
 
-    def dumps(self, obj, *args, **kw):
-        return json.dumps(self.dump_objects(obj, kw.pop('context', None)),
-                          *args, **kw)
+        Takes the same arguments as :meth:`dumps`, as well as
+        ``compress``: ``'gzip'`` or ``'bz2'`` to compress what is
+        written to fp while it is written.
+        """
+        compress = kw.pop('compress', None)
+        if compress is not None:
+            writer = CompressingWriter(fp, compress)
+            self.dump(obj, writer, *args, **kw)
+            writer.finish()
+            return
+        if kw.get('stats') is not None:
+            # we need the serialized size, so serialize in one go
+            fp.write(self.dumps(obj, *args, **kw))
+            return
+        kw.pop('stats', None)
+        return json.dump(
+            self.dump_objects(
+                obj, kw.pop('context', None),
+                references=kw.pop('references', False),
+                limits=kw.pop('limits', None),
+                reference_context=kw.pop('reference_context', False)),
+            fp, *args, **kw)
 
-    def load(self, *args, **kw):
-        context = kw.pop('context', None)
-        plain = json.load(*args, **kw)
-        return self.load_objects(plain, context)
+    def dump_iter(self, objs, fp, *args, **kw):
+        """Dump objs to fp as newline delimited JSON, one line each.
 
-    def loads(self, *args, **kw):
+        Takes the same arguments as :meth:`dumps`, as well as
+        ``dead_letter``. Without it the first ``DumpError`` is
+        raised. With it an object that cannot be dumped is passed to
+        the dead letter sink with its index and the error, and the
+        rest is dumped. The sink is a callable or a file to write them
+        to as lines of JSON. ``compress`` is as for :meth:`dump`.
+        """
+        compress = kw.pop('compress', None)
+        if compress is not None:
+            writer = CompressingWriter(fp, compress)
+            self.dump_iter(objs, writer, *args, **kw)
+            writer.finish()
+            return
+        dead_letter = dead_letter_sink(kw.pop('dead_letter', None))
+        for index, obj in enumerate(objs):
+            try:
+                s = self.dumps(obj, *args, **kw)
+            except DumpError, e:
+                if dead_letter is None:
+                    raise
+                dead_letter(index, obj, e)
+                continue
+            fp.write(s)
+            fp.write('\n')
+
+    def dumps(self, obj, *args, **kw):
         context = kw.pop('context', None)
-        plain = json.loads(*args, **kw)
-        return self.load_objects(plain, context)
+        stats = kw.pop('stats', None)
+        references = kw.pop('references', False)
+        limits = kw.pop('limits', None)
+        reference_context = kw.pop('reference_context', False)
+        result = None
+        if (limits is None and not reference_context and not args and
+                'default' not in kw and 'cls' not in kw):
+            result = self._dumps_plain(obj, context, kw)
+        if result is None:
+            result = json.dumps(
+                self.dump_objects(obj, context, stats=stats,
+                                  references=references, limits=limits,
+                                  reference_context=reference_context),
+                *args, **kw)
+        if stats is not None:
+            stats.bytes_out += len(result)
+        return result
+
+    def _dumps_plain(self, obj, context, kw):
+        # serialize obj as it is if there turns out to be nothing to
+        # convert, which is faster than looking first
+        original_context = None
+        if isinstance(obj, dict):
+            original_context = obj.get('@context')
+        if not self._passthrough(context, original_context):
+            return None
+        if ((self._json_encodes_nodes or self._node_vocabularies) and
+                not is_plain_json(obj, self.max_depth)):
+            # json would serialize a node, such as a namedtuple
+            return None
+        try:
+            result = json.dumps(obj, **kw)
+        except (TypeError, ValueError, RuntimeError):
+            # a custom object, a cycle, or nested too deep for json
+            return None
+        # json never escapes @, so these are found if they are there
+        contexts = 1 if original_context is not None else 0
+        if '"@type"' in result or result.count('"@context"') > contexts:
+            return None
+        check_depth(result, obj, self.max_depth)
+        return result
+
+    def dumpb(self, obj, context=None, **kw):
+        """Dump obj to CBOR.
+
+        Dates and datetimes are not dumped to strings by their value
+        types but written as tagged CBOR values. Other arguments are
+        as for :meth:`dump_objects`.
+        """
+        stats = kw.get('stats')
+        result = cbor.dumps(self.dump_objects(obj, context,
+                                              native=cbor.NATIVE, **kw))
+        if stats is not None:
+            stats.bytes_out += len(result)
+        return result
+
+    def loadb(self, b, context=None, **kw):
+        """Load CBOR, as written by :meth:`dumpb`.
+
+        Tagged dates and datetimes are decoded as such and not loaded
+        again by their value types. Other arguments are as for
+        :meth:`load_objects`.
+        """
+        stats = kw.get('stats')
+        if stats is not None:
+            stats.bytes_in += len(b)
+        limits = kw.pop('limits', None)
+        budget = None
+        if limits is not None:
+            budget = limits.start()
+            budget.check_bytes(len(b))
+        d = cbor.loads(b, self._max_depth(budget))
+        if not isinstance(d, dict):
+            return d
+        # the decoded structure is ours to reuse
+        kw.setdefault('inplace', True)
+        return self.load_objects(d, context, limits=budget,
+                                 native=cbor.NATIVE, **kw)
+
+    def load_path(self, path, *args, **kw):
+        """Load the JSON document in the file at path.
+
+        The file is read through a memory map rather than a file
+        object. Takes the same arguments as :meth:`loads`. A gzip or
+        bz2 compressed file is decompressed.
+        """
+        m = map_file(path)
+        if m is None:
+            return self.loads('', *args, **kw)
+        try:
+            format = detect(m[:MAGIC_SIZE])
+            if format is not None:
+                return self._load(DecompressingReader(m, format), args, kw)
+            # the json module only parses from a string, so we cannot
+            # avoid copying a single document out of the map
+            return self.loads(m[:], *args, **kw)
+        finally:
+            m.close()
+
+    def load_iter(self, fp, *args, **kw):
+        """Load newline delimited JSON from fp.
+
+        Returns an iterator over the loaded documents, one for each
+        line; empty lines are skipped. Takes the same arguments as
+        :meth:`loads`, as well as ``dead_letter``, like
+        :meth:`dump_iter`; lines that are not valid JSON are passed to
+        it too. The index of a line does not count empty lines.
+
+        Like :meth:`load` this decompresses gzip or bz2 compressed
+        input, a chunk at a time.
+        """
+        lines = (line for line in open_input(fp) if line.strip())
+        return self._load_lines(lines, args, kw)
+
+    def _load_lines(self, lines, args, kw):
+        dead_letter = dead_letter_sink(kw.pop('dead_letter', None))
+        for index, line in enumerate(lines):
+            try:
+                obj = self.loads(line, *args, **kw)
+            except (LoadError, ValueError), e:
+                # ValueError is what json raises for a malformed line
+                if dead_letter is None:
+                    raise
+                dead_letter(index, line, e)
+                continue
+            yield obj
+
+    def load_iter_path(self, path, *args, **kw):
+        """Load newline delimited JSON from the file at path.
+
+        Like :meth:`load_iter`, but the file is read through a memory
+        map and only one line at a time is copied out of it, so the
+        file can be much larger than memory. A compressed file is
+        decompressed a chunk at a time.
+        """
+        m = map_file(path)
+        if m is None:
+            return
+        try:
+            format = detect(m[:MAGIC_SIZE])
+            if format is not None:
+                lines = (line for line in DecompressingReader(m, format)
+                         if line.strip())
+            else:
+                lines = (line for offset, line in iter_lines(m))
+            for obj in self._load_lines(lines, args, kw):
+                yield obj
+        finally:
+            m.close()
+
+    def load(self, fp, *args, **kw):
+        """Load JSON from fp.
+
+        Takes the same arguments as :meth:`loads`. Input compressed with
+        gzip or bz2 is recognized and decompressed while it is read;
+        ``max_bytes`` then limits the decompressed size.
+        """
+        return self._load(open_input(fp), args, kw)
+
+    def _load(self, fp, args, kw):
+        limits = kw.get('limits')
+        if limits is not None and limits.max_bytes is not None:
+            # no need to read more than enough to exceed the limit
+            return self.loads(fp.read(limits.max_bytes + 1), *args, **kw)
+        return self.loads(fp.read(), *args, **kw)
+
+    def loads(self, s, *args, **kw):
+        context = self.resolve_context(kw.pop('context', None))
+        stats = kw.pop('stats', None)
+        limits = kw.pop('limits', None)
+        if stats is not None:
+            stats.bytes_in += len(s)
+        if limits is not None:
+            # parsing counts towards the deadline
+            limits = limits.start()
+            limits.check_bytes(len(s))
+        plain = None
+        if limits is None and '@type' not in s and '\\u' not in s:
+            # without @type (even escaped) only a context can call for
+            # conversion, so we may not need to look at the result
+            plain = json.loads(s, *args, **kw)
+            if not isinstance(plain, dict):
+                check_depth(s, plain, self.max_depth)
+                return plain
+            # json never escapes @, so a nested @context is found
+            contexts = 1 if '@context' in plain else 0
+            if (s.count('"@context"') == contexts and
+                    self._passthrough(context, plain.get('@context'))):
+                check_depth(s, plain, self.max_depth)
+                return plain
+        cache = self.result_cache
+        if cache is None or args or kw:
+            if plain is None:
+                plain = json.loads(s, *args, **kw)
+            return self.load_objects(plain, context, stats=stats,
+                                     limits=limits)
+        key = cache.key(s, self.compile_context(context).key, False)
+        result = cache.get(key)
+        if result is not None:
+            return result
+        if plain is None:
+            plain = json.loads(s)
+        types = set()
+        result = self.load_objects(plain, context, stats=stats, types=types,
+                                   limits=limits)
+        return cache.put(key, result, frozenset(types))
+
+
+class FrozenJsonValue(JsonValue):
+    """A JsonValue with a compiled registry that cannot be changed.
+
+    Create it with :meth:`JsonValue.freeze`.
+    """
+    def __init__(self, jv, result_cache=None):
+        JsonValue.__init__(self, jv.metrics, result_cache, jv.max_depth)
+        self._iri_to_value_type = jv._iri_to_value_type.copy()
+        self._iri_to_node_type = jv._iri_to_node_type.copy()
+        self._class_to_node_type = jv._class_to_node_type.copy()
+        self._value_vocabularies = list(jv._value_vocabularies)
+        self._node_vocabularies = list(jv._node_vocabularies)
+        self._context_urls = jv._context_urls.copy()
+        self._context_references = jv._context_references.copy()
+        self._json_encodes_nodes = jv._json_encodes_nodes
+        self._value_loaders = dict(
+            (iri, (t.validate_load, t.load))
+            for iri, t in self._iri_to_value_type.items())
+        self._value_dumpers = dict(
+            (iri, (t.validate_dump, t.dump))
+            for iri, t in self._iri_to_value_type.items())
+        self._node_loaders = dict(
+            (iri, (t.load, t.load_context, getattr(t, 'load_many', None)))
+            for iri, t in self._iri_to_node_type.items())
+        self._node_dumpers = dict(
+            (cls, (t.dump, t.id()))
+            for cls, t in self._class_to_node_type.items())
+
+    def value_type(self, iri, type):
+        raise FrozenError("Cannot register value type on frozen JsonValue")
+
+    def node_type(self, iri, type):
+        raise FrozenError("Cannot register node type on frozen JsonValue")
+
+    def value_vocabulary(self, types):
+        raise FrozenError(
+            "Cannot register value vocabulary on frozen JsonValue")
+
+    def node_vocabulary(self, types):
+        raise FrozenError(
+            "Cannot register node vocabulary on frozen JsonValue")
+
+    def context_url(self, url, context):
+        raise FrozenError("Cannot register context on frozen JsonValue")
+
+    # types from lazy vocabularies are part of the frozen registry,
+    # they are only added to the dispatch tables when first looked up
+
+    def _lazy_value_type(self, iri):
+        for vocabulary in self._value_vocabularies:
+            t = vocabulary.get(iri)
+            if t is not None:
+                self._value_loaders[iri] = t.validate_load, t.load
+                self._value_dumpers[iri] = t.validate_dump, t.dump
+                self._iri_to_value_type[iri] = t
+                return t
+        return None
+
+    def _lazy_node_type(self, iri):
+        for vocabulary in self._node_vocabularies:
+            t = vocabulary.get(iri)
+            if t is not None:
+                self._add_node_type(iri, t)
+                return t
+        return None
+
+    def _lazy_node_type_for_class(self, cls):
+        for vocabulary in self._node_vocabularies:
+            entry = vocabulary.get_for_class(cls)
+            if entry is not None:
+                self._add_node_type(*entry)
+                return entry[1]
+        return None
+
+    def _add_node_type(self, iri, t):
+        self._node_loaders[iri] = (t.load, t.load_context,
+                                   getattr(t, 'load_many', None))
+        self._node_dumpers[t.cls] = t.dump, t.id()
+        self._iri_to_node_type[iri] = t
+        self._class_to_node_type[t.cls] = t
+
+    def can_load_value(self, id):
+        return (id in self._value_loaders or
+                (bool(self._value_vocabularies) and
+                 self._lazy_value_type(id) is not None))
+
+    def load_value(self, term, type, value, extra):
+        entry = self._value_loaders.get(type)
+        if entry is None and self._value_vocabularies:
+            if self._lazy_value_type(type) is not None:
+                entry = self._value_loaders[type]
+        if entry is None or value is None:
+            return value
+        if self.metrics is not None:
+            return self.metrics.measure('load_value', type, self._load_value,
+                                        entry, term, type, value, extra)
+        return self._load_value(entry, term, type, value, extra)
+
+    def _load_value(self, entry, term, type, value, extra):
+        validate_load, load = entry
+        if not validate_load(value, extra):
+            raise ValueLoadError(term, type, value)
+        try:
+            return load(value, extra)
+        except ValueError:
+            raise ValueLoadError(term, type, value)
+
+    def load_context(self, type):
+        return self._node_loaders[type][1]
+
+    def dump_value(self, term, type, value, extra):
+        entry = self._value_dumpers.get(type)
+        if entry is None and self._value_vocabularies:
+            if self._lazy_value_type(type) is not None:
+                entry = self._value_dumpers[type]
+        if entry is None or value is None:
+            return value
+        if self.metrics is not None:
+            return self.metrics.measure('dump_value', type, self._dump_value,
+                                        entry, term, type, value, extra)
+        return self._dump_value(entry, term, type, value, extra)
+
+    def _dump_value(self, entry, term, type, value, extra):
+        validate_dump, dump = entry
+        if not validate_dump(value, extra):
+            raise ValueDumpError(term, type, value)
+        return dump(value, extra)
+
+    def is_loaded_value(self, type, value, extra):
+        entry = self._value_dumpers.get(type)
+        if entry is None and self._value_vocabularies:
+            if self._lazy_value_type(type) is not None:
+                entry = self._value_dumpers[type]
+        return entry is not None and entry[0](value, extra)
+
+    def can_load_node(self, id):
+        return (id in self._node_loaders or
+                (bool(self._node_vocabularies) and
+                 self._lazy_node_type(id) is not None))
+
+    def load_node(self, id, d, extra):
+        load = self._node_loaders[id][0]
+        if self.metrics is not None:
+            return self.metrics.measure('load_node', id, load, d, extra)
+        return load(d, extra)
+
+    def can_load_many(self, id):
+        return self._node_loaders[id][2] is not None
+
+    def load_many(self, id, dicts, extra):
+        load_many = self._node_loaders[id][2]
+        if self.metrics is not None:
+            return self.metrics.measure('load_many', id, load_many, dicts,
+                                        extra)
+        return load_many(dicts, extra)
+
+    def can_dump_node(self, obj):
+        return (type(obj) in self._node_dumpers or
+                (bool(self._node_vocabularies) and
+                 self._lazy_node_type_for_class(type(obj)) is not None))
+
+    def dump_node(self, obj, extra):
+        dump, id = self._node_dumpers[type(obj)]
+        if self.metrics is not None:
+            result = self.metrics.measure('dump_node', id, dump, obj, extra)
+        else:
+            result = dump(obj, extra)
+        result['@type'] = id
+        return result
 
 
 class CustomValueType(object):
@@ -143,11 +1055,19 @@ class CustomValueType(object):
 
 
 class CustomNodeType(object):
-    def __init__(self, cls, dump, load, load_context):
+    def __init__(self, cls, dump, load, load_context, cacheable=False,
+                 load_many=None):
         self.cls = cls
         self.dump = dump
         self.load = load
         self.load_context = load_context
+        # objects are immutable and their dump does not depend on
+        # extra, so their dumped form can be reused
+        self.cacheable = cacheable
+        # optional, takes a list of dicts and extra, returns a list with
+        # an object for each dict. Used instead of load so all nodes
+        # of this type in a document are loaded in one go.
+        self.load_many = load_many
 
     def id(self):
         return 'http://jsonvalue.org/internal/nodetype/%s' % self.cls.__name__
@@ -181,121 +1101,654 @@ def valuetypes(d):
     return context
 
 
+def map_file(path):
+    """Return a read-only memory map of the file at path.
+
+    Returns ``None`` for an empty file, which cannot be mapped.
+    """
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        # the map stays valid after the file is closed
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def iter_lines(m, start=0, end=None):
+    """Iterate over the non-empty lines in memory map m.
+
+    Yields ``(offset, line)`` tuples, where offset is the byte offset
+    of the line in the map. Only the lines starting before ``end`` are
+    included.
+    """
+    if end is None:
+        end = len(m)
+    size = len(m)
+    while start < end:
+        line_end = m.find('\n', start)
+        if line_end == -1:
+            line_end = size
+        line = m[start:line_end]
+        if line.strip():
+            yield start, line
+        start = line_end + 1
+
+
+# the type of the value objects that stand in for loaded objects
+OBJECT_TYPE = 'http://jsonvalue.org/object_type'
+
+
+def object_marker(object_id):
+    return {
+        '@type': OBJECT_TYPE,
+        '@value': object_id,
+    }
+
+
+class LoadedObjects(dict):
+    """Loaded objects by object id.
+
+    Nodes of a type with ``load_many`` are deferred: they are loaded in
+    a batch with all other deferred nodes of their type when
+    :meth:`flush` is called. Nodes are loaded level by level with a flush
+    after each, so the nodes a node contains are always loaded first.
+    """
+    def __init__(self, jv=None, extra=None):
+        dict.__init__(self)
+        self.jv = jv
+        self.extra = extra
+        self.count = 0
+        # type IRI -> list of (object id, dict)
+        self.pending = {}
+
+    def defer(self, object_id, type, d):
+        self.pending.setdefault(type, []).append((object_id, d))
+        return object_id
+
+    def flush(self):
+        """Load all deferred nodes.
+        """
+        for type in sorted(self.pending):
+            batch = self.pending.pop(type)
+            objs = self.jv.load_many(type, [d for object_id, d in batch],
+                                     self.extra)
+            if len(objs) != len(batch):
+                raise ValueError(
+                    "load_many for %s returned %s objects for %s nodes" %
+                    (type, len(objs), len(batch)))
+            for (object_id, d), obj in zip(batch, objs):
+                self[object_id] = obj
+
+    def new_id(self):
+        object_id = 'http://jsonvalue.org/object/%s' % self.count
+        self.count += 1
+        return object_id
+
+
 class LoadInfo(object):
-    def __init__(self):
-        self.objects = {}
+    def __init__(self, types=None, jv=None, extra=None):
+        self.objects = LoadedObjects(jv, extra)
+        # type IRIs encountered
+        self.types = types if types is not None else set()
+        # maps node @id to the object id of the loaded node
+        self.ids = {}
+        # node @ids of references we met before their node was loaded
+        self.references = set()
+        # nodes are loaded after the walk, by level: a node of level n
+        # contains nodes of lower levels only, at least one of n - 1
+        self.levels = {}
+        # (level, object id, type IRI, dict) for each node to load
+        self.pending = []
+        # dicts of the nodes their type did not load, by object id
+        self.unloaded = {}
+        # object ids of those put back in place of their marker
+        self.restored = set()
         self.errors = []
+        self.nodes = 0
+        self.values = 0
+
+
+def copy_container(c):
+    if isinstance(c, dict):
+        return c.copy()
+    return list(c)
+
+
+def copy_json(o):
+    """Return a copy of the dicts and lists in o, sharing the rest.
+    """
+    if not isinstance(o, (dict, list)):
+        return o
+    result = copy_container(o)
+    stack = [result]
+    while stack:
+        c = stack.pop()
+        items = c.iteritems() if isinstance(c, dict) else enumerate(c)
+        # replacing values does not disturb the iteration
+        for key, value in items:
+            if isinstance(value, (dict, list)):
+                value = c[key] = copy_container(value)
+                stack.append(value)
+    return result
+
+
+def is_plain_json(o, max_depth):
+    """Whether o is only dicts, lists and scalars, not subclasses.
+
+    Anything nested deeper than max_depth counts as not plain.
+    """
+    stack = [(o, 1)]
+    while stack:
+        o, depth = stack.pop()
+        cls = o.__class__
+        if cls in JSON_SCALARS:
+            continue
+        if depth > max_depth:
+            return False
+        if cls is dict:
+            stack.extend((value, depth + 1) for value in o.itervalues())
+        elif cls is list:
+            stack.extend((value, depth + 1) for value in o)
+        else:
+            return False
+    return True
+
+
+def check_depth(s, o, max_depth):
+    """Raise DepthError if o, which s is the JSON of, is too deep.
+
+    Every level opens a bracket in s, so o is only walked if s has more
+    brackets than max_depth.
+    """
+    if s.count('{') + s.count('[') > max_depth:
+        check_input(o, max_depth)
+
 
+def check_input(o, max_depth, budget=None):
+    """Check input before processing it.
+
+    Raises :class:`jsonvalue.error.DepthError` if o is too deep, every
+    dict and list counting as a level. Every dict counts as a node of
+    the budget, if any.
+
+    Returns whether o is plain: JSON without any ``@type`` or nested
+    ``@context``, so that only its own context can call for conversion.
+    """
+    if not isinstance(o, (dict, list)):
+        return o.__class__ in JSON_SCALARS or isinstance(
+            o, (basestring, int, float, bool, NoneType))
+    plain = True
+    stack = [(o, 1)]
+    while stack:
+        o, depth = stack.pop()
+        if depth > max_depth:
+            raise DepthError(max_depth)
+        if isinstance(o, dict):
+            if budget is not None:
+                budget.node()
+            if '@type' in o:
+                plain = False
+            if '@context' in o:
+                # the context of the document is judged on its own, we
+                # do not look into those of nested nodes
+                if depth > 1:
+                    plain = False
+                values = [value for key, value in o.iteritems()
+                          if key != '@context']
+            else:
+                values = o.itervalues()
+        else:
+            values = o
+        for value in values:
+            if value.__class__ in JSON_SCALARS:
+                continue
+            if isinstance(value, (dict, list)):
+                stack.append((value, depth + 1))
+            elif not isinstance(value, (basestring, int, float, bool,
+                                        NoneType)):
+                # a custom object
+                plain = False
+    return plain
+
+
+# The transformations below are copy-on-write: a dict or list is only
+# copied when something underneath it was converted, otherwise the
+# original is kept. In inplace mode nothing is copied and converted
+# values are written into the original instead.
+#
+# They walk the structure with an explicit stack rather than by
+# recursion, so deeply nested input cannot exhaust the Python stack.
+# The container being walked is kept in local variables: its original,
+# its result (the original until something is converted) and an
+# iterator over its items. Descending pushes these on the stack, so the
+# iterator resumes where it left off when we come back up.
 
 class LoadTransformer(object):
-    def __init__(self, jv, context, reject_unknown, extra):
+    def __init__(self, jv, context, reject_unknown, extra, stats=NULL_STATS,
+                 inplace=False, types=None, budget=None, native=None):
         self.jv = jv
         self.context = context
         self.reject_unknown = reject_unknown
         self.extra = extra
+        self.stats = stats
+        self.inplace = inplace
+        self.types = types
+        # nodes are counted before expansion, we only watch the clock
+        self.budget = budget
+        self.native = native
 
     def __call__(self, expanded):
-        load_info = LoadInfo()
-        objectified = self._list('_', expanded, load_info)
+        stats = self.stats
+        objectified, load_info = self.transform(expanded)
+        with stats.timer('compact'):
+            compacted = jsonld.compact(objectified, self.context,
+                                       self.jv.jsonld_options())
+        if self.budget is not None:
+            self.budget.check_time()
+        with stats.timer('realize'):
+            return self.realize(compacted, load_info.objects)
+
+    def expanded(self, expanded):
+        """Load expanded form, keeping it expanded.
+        """
+        objectified, load_info = self.transform(expanded)
+        with self.stats.timer('realize'):
+            return self.realize(objectified, load_info.objects)
+
+    def transform(self, expanded):
+        """Load values and nodes in expanded.
+
+        Returns the result, with object markers in place of loaded
+        nodes, and the :class:`LoadInfo`.
+        """
+        stats = self.stats
+        load_info = LoadInfo(self.types, self.jv, self.extra)
+        with stats.timer('transform'):
+            if isinstance(expanded, dict):
+                objectified = self._list('_', [expanded], load_info)[0]
+            else:
+                objectified = self._list('_', expanded, load_info)
+        stats.count(load_info.nodes, load_info.values)
         if load_info.errors:
             # for a stable errors listing
             load_info.errors.sort(key=lambda err: err.term)
             raise LoadError(load_info.errors)
-        compacted = jsonld.compact(objectified, self.context)
-        return self.realize(compacted, load_info.objects)
+        with stats.timer('transform'):
+            if not load_info.references.isdisjoint(load_info.ids):
+                objectified = self._resolve(objectified, load_info.ids)
+            self._load_nodes(load_info)
+            if load_info.unloaded:
+                objectified = self._restore(objectified, load_info)
+        return objectified, load_info
 
-    def realize(self, o, objects):
+    def _load_nodes(self, info):
+        """Load the nodes found by the walk, level by level.
+
+        The nodes a node contains are of lower levels, so they are
+        loaded when it is. The nodes of a level with a ``load_many``
+        type are loaded in one batch.
+        """
+        jv = self.jv
+        objects = info.objects
+        budget = self.budget
+        # a reference inside a node can only become the object if that
+        # is loaded before, so of a lower level
+        resolve = not info.references.isdisjoint(info.ids)
+        loaded_ids = {}
+        # sorting is stable, so a level is loaded in document order
+        pending = sorted(info.pending, key=itemgetter(0))
+        for level, nodes in groupby(pending, key=itemgetter(0)):
+            nodes = list(nodes)
+            for level, object_id, type, d in nodes:
+                if budget is not None:
+                    budget.check_time()
+                if loaded_ids:
+                    d = self._resolve(d, loaded_ids)
+                if info.unloaded:
+                    d = self._restore(d, info)
+                with self.stats.timer('node_compact'):
+                    compacted = jsonld.compact(d, jv.load_context(type),
+                                               jv.jsonld_options())
+                    del compacted['@context']
+                    compacted = self.realize(compacted, objects)
+                if jv.can_load_many(type):
+                    objects.defer(object_id, type, compacted)
+                    continue
+                obj = jv.load_node(type, compacted, self.extra)
+                if obj is None:
+                    info.unloaded[object_id] = d
+                else:
+                    objects[object_id] = obj
+            objects.flush()
+            if resolve:
+                for level, object_id, type, d in nodes:
+                    node_id = d.get('@id')
+                    if node_id is not None and object_id not in info.unloaded:
+                        loaded_ids[node_id] = object_id
+
+    def _restore(self, o, info):
+        """Put the nodes their type did not load back into o.
+
+        The first marker of such a node becomes the node, later ones a
+        reference to it if it has an ``@id``.
+        """
+        unloaded = info.unloaded
+        restored = info.restored
+
+        def replace(value):
+            if value.get('@type') != OBJECT_TYPE:
+                return None
+            object_id = value.get('@value')
+            d = unloaded.get(object_id)
+            if d is None:
+                return None
+            if object_id in restored and '@id' in d:
+                return {'@id': d['@id']}
+            restored.add(object_id)
+            return d
+        return self._replace(o, replace)
+
+    def _resolve(self, o, ids):
+        """Replace references to nodes in ids by object markers.
+
+        The walk only does this for nodes it met before the reference,
+        and it follows the order of the expanded document rather than
+        the original.
+        """
+        def replace(value):
+            if len(value) == 1 and value.get('@id') in ids:
+                return object_marker(ids[value['@id']])
+            return None
+        return self._replace(o, replace)
+
+    def _replace(self, o, replace):
+        """Replace the dicts in o for which replace returns a value.
+        """
         if isinstance(o, dict):
-            return self._realize_dict(o, objects)
+            new_o = replace(o)
+            if new_o is not None:
+                return new_o
+            items = o.iteritems()
         elif isinstance(o, list):
-            return self._realize_list(o, objects)
+            items = enumerate(o)
         else:
             return o
+        inplace = self.inplace
+        stack = []
+        original = result = o
+        while True:
+            for key, value in items:
+                if isinstance(value, dict):
+                    new_value = replace(value)
+                    if new_value is not None:
+                        if result is original and not inplace:
+                            result = copy_container(original)
+                        result[key] = new_value
+                        continue
+                    stack.append((original, result, items, key))
+                    original = result = value
+                    items = value.iteritems()
+                    break
+                elif isinstance(value, list):
+                    stack.append((original, result, items, key))
+                    original = result = value
+                    items = enumerate(value)
+                    break
+            else:
+                if not stack:
+                    return result
+                new_value = result
+                child = original
+                original, result, items, key = stack.pop()
+                if new_value is not child:
+                    if result is original and not inplace:
+                        result = copy_container(original)
+                    result[key] = new_value
 
-    def _realize_dict(self, d, objects):
-        type = d.get('@type')
-        if type == 'http://jsonvalue.org/object_type':
-            value = d.get('@value')
-            return objects[value]
-        result = {}
-        for key, value in d.items():
-            result[key] = self.realize(value, objects)
-        return result
-
-    def _realize_list(self, l, objects):
-        return [self.realize(value, objects) for value in l]
-
-    def _dict(self, d, info):
-        result = {}
-        for term, l in d.items():
-            if not isinstance(l, list):
-                result[term] = l
-                continue
-            result[term] = self._list(term, l, info)
-        return result
+    def realize(self, o, objects):
+        """Replace the object markers in o by the loaded objects.
+        """
+        if isinstance(o, dict):
+            if o.get('@type') == OBJECT_TYPE:
+                return objects[o.get('@value')]
+            items = o.iteritems()
+        elif isinstance(o, list):
+            items = enumerate(o)
+        else:
+            return o
+        inplace = self.inplace
+        stack = []
+        original = result = o
+        while True:
+            for key, value in items:
+                if isinstance(value, dict):
+                    if value.get('@type') == OBJECT_TYPE:
+                        if result is original and not inplace:
+                            result = copy_container(original)
+                        result[key] = objects[value.get('@value')]
+                        continue
+                    stack.append((original, result, items, key))
+                    original = result = value
+                    items = value.iteritems()
+                    break
+                elif isinstance(value, list):
+                    stack.append((original, result, items, key))
+                    original = result = value
+                    items = enumerate(value)
+                    break
+            else:
+                if not stack:
+                    return result
+                new_value = result
+                child = original
+                original, result, items, key = stack.pop()
+                if new_value is not child:
+                    if result is original and not inplace:
+                        result = copy_container(original)
+                    result[key] = new_value
 
     def _list(self, term, l, info):
-        result = []
-        for d in l:
-            if not isinstance(d, dict):
-                result.append(d)
-                continue
-            result.append(self._value(term, d, info))
-        return result
+        """Transform a list of expanded values for term.
+        """
+        inplace = self.inplace
+        budget = self.budget
+        ids = info.ids
+        levels = info.levels
+        stack = []
+        original = result = l
+        items = enumerate(l)
+        # we walk the values in a list, and the lists in a value
+        is_list = True
+        # the highest level of the nodes to load in what we walk
+        level = 0
+        while True:
+            for key, value in items:
+                if not is_list:
+                    if isinstance(value, list):
+                        stack.append((original, result, items, is_list, term,
+                                      key, level))
+                        original = result = value
+                        items = enumerate(value)
+                        is_list = True
+                        term = key
+                        level = 0
+                        break
+                    continue
+                if not isinstance(value, dict):
+                    continue
+                node_id = value.get('@id')
+                if node_id is not None and node_id in ids:
+                    # a node we already met, or a reference to it
+                    if result is original and not inplace:
+                        result = list(original)
+                    result[key] = object_marker(ids[node_id])
+                    level = max(level, levels[ids[node_id]])
+                    continue
+                if node_id is not None and len(value) == 1:
+                    # its node may come later, see _resolve
+                    info.references.add(node_id)
+                if '@value' in value:
+                    # a value object has no lists to descend into
+                    new_value = self._value(term, value, value, info)
+                    if new_value is not value:
+                        if result is original and not inplace:
+                            result = list(original)
+                        result[key] = new_value
+                    continue
+                if budget is not None:
+                    budget.check_time()
+                stack.append((original, result, items, is_list, term, key,
+                              level))
+                original = result = value
+                items = value.iteritems()
+                is_list = False
+                level = 0
+                break
+            else:
+                if is_list:
+                    new_value = result
+                else:
+                    new_value = self._value(term, original, result, info,
+                                            level)
+                    if new_value is not result:
+                        # a node to load, which contains the others
+                        level = levels.get(new_value.get('@value'), level)
+                if not stack:
+                    return new_value
+                child = original
+                child_level = level
+                (original, result, items, is_list, term, key,
+                 level) = stack.pop()
+                level = max(level, child_level)
+                if new_value is not child:
+                    if result is original and not inplace:
+                        result = copy_container(original)
+                    result[key] = new_value
 
-    def _value(self, term, d, info):
-        d = self._dict(d, info)
+    def _value(self, term, original, d, info, level=0):
+        # d is the original value dict with its lists transformed, level
+        # the highest level of the nodes to load in it
         type = d.get('@type')
         value = d.get('@value')
         if type is None:
             if value is not None:
+                info.values += 1
                 if self.reject_unknown:
-                    info.errors.append(ValueLoadError(term, None, value))
+                    self._error(info, ValueLoadError(term, None, value))
+            else:
+                info.nodes += 1
             return d
         if value is not None:
+            info.values += 1
+            info.types.add(type)
+            native = self.native
+            if (native is not None and isinstance(value, native) and
+                    self.jv.is_loaded_value(type, value, self.extra)):
+                return d
             if not self.jv.can_load_value(type):
                 if self.reject_unknown:
-                    info.errors.append(ValueLoadError(term, type, value))
+                    self._error(info, ValueLoadError(term, type, value))
                 return d
-            d = d.copy()
             try:
-                d['@value'] = self.jv.load_value(term, type, value, self.extra)
+                new_value = self.jv.load_value(term, type, value, self.extra)
             except ValueLoadError, e:
-                info.errors.append(e)
+                self._error(info, e)
+                return d
+            if new_value is value:
+                return d
+            if d is original and not self.inplace:
+                d = d.copy()
+            d['@value'] = new_value
             return d
-        return self._node_value(d, type, info)
+        info.nodes += 1
+        info.types.update(type)
+        return self._node_value(d, type, info, level + 1)
+
+    def _error(self, info, error):
+        info.errors.append(error)
+        if self.budget is not None:
+            self.budget.check_errors(info.errors)
 
-    def _node_value(self, d, type, info):
+    def _node_value(self, d, type, info, level):
         # XXX what if there are more than one node types?
         type = type[0]
         if not self.jv.can_load_node(type):
             return d
-        load_context = self.jv.load_context(type)
-        compacted = jsonld.compact(d, load_context)
-        del compacted['@context']
-        compacted = self.realize(compacted, info.objects)
-        obj = self.jv.load_node(type, compacted, self.extra)
-        if obj is None:
-            return d
-        new_id = 'http://jsonvalue.org/object/%s' % len(info.objects)
-        info.objects[new_id] = obj
-        return {
-            '@type': 'http://jsonvalue.org/object_type',
-            '@value': new_id,
-        }
+        # it is loaded after the walk, see _load_nodes
+        new_id = info.objects.new_id()
+        info.levels[new_id] = level
+        info.pending.append((level, new_id, type, d))
+        node_id = d.get('@id')
+        if node_id is not None:
+            info.ids[node_id] = new_id
+        return object_marker(new_id)
 
 
 class DumpTransformer(object):
-    def __init__(self, jv, context, extra):
+    def __init__(self, jv, context, extra, stats=NULL_STATS, inplace=False,
+                 references=False, max_depth=None, budget=None, native=None):
         self.jv = jv
         self.context = context
         self.extra = extra
+        self.stats = stats
+        self.inplace = inplace
+        self.references = references
+        if max_depth is None:
+            max_depth = float('inf')
+        self.max_depth = max_depth
+        self.budget = budget
+        self.native = native
+        # whether we expand the dumped form of objects, for expanded input
+        self.expand_nodes = False
+        # nesting depth of the structure the current dump call is in
+        self.depth = 0
+        # maps id() of dumped objects to their node @id and the object,
+        # which we keep alive so its id() is not reused
+        self.ids = {}
+        # stack of sets of classes dumped for cacheable objects
+        self.classes = []
+        self.nodes = 0
+        self.values = 0
+
+    def __call__(self, wrapped):
+        stats = self.stats
+        with stats.timer('dump'):
+            # the wrapper is ours, only the document counts
+            d = wrapped['http://jsonvalue.org/main']
+            dumped = self.dump(d)
+            if dumped is not d:
+                wrapped = wrapped.copy()
+                wrapped['http://jsonvalue.org/main'] = dumped
+        with stats.timer('expand'):
+            expanded = jsonld.expand(
+                wrapped, self.jv.jsonld_options(expandContext=self.context))
+        if self.budget is not None:
+            self.budget.check_time()
+        return self.transform(expanded)
+
+    def expanded(self, d):
+        """Dump expanded form, keeping it expanded.
 
-    def __call__(self, d):
-        d = self.dump(d)
-        expanded = jsonld.expand(d, dict(expandContext=self.context))
+        Custom objects in d are dumped and then expanded with our
+        context.
+        """
+        self.expand_nodes = True
+        with self.stats.timer('dump'):
+            dumped = self.dump(d)
+            if dumped is not d and not isinstance(d, (dict, list)):
+                # a custom object, dump only expands those inside
+                dumped = self._expand_node(dumped)
+        return self.transform(dumped)
+
+    def transform(self, expanded):
+        """Dump the values in expanded.
+        """
         errors = []
-        result = self._expanded(expanded, errors)
+        with self.stats.timer('transform'):
+            if isinstance(expanded, dict):
+                result = self._list('_', [expanded], errors)[0]
+            else:
+                result = self._list('_', expanded, errors)
+        self.stats.count(self.nodes, self.values)
         if errors:
             # for a stable errors listing
             errors.sort(key=lambda err: err.term)
@@ -303,67 +1756,187 @@ class DumpTransformer(object):
         return result
 
     def dump(self, d):
+        """Dump the custom objects in d.
+
+        Raises :class:`jsonvalue.error.DepthError` if the result is
+        nested deeper than ``max_depth``.
+        """
+        budget = self.budget
         if isinstance(d, dict):
-            return self._dump_dict(d)
+            if budget is not None:
+                budget.node()
+            items = d.iteritems()
         elif isinstance(d, list):
-            return self._dump_list(d)
+            items = enumerate(d)
         elif isinstance(d, (basestring, int, float, bool, NoneType)):
             return d
         else:
             return self._dump_obj(d)
+        inplace = self.inplace
+        # the dumped form of a node is dumped by a nested call, which
+        # continues at our depth
+        base = self.depth
+        max_depth = self.max_depth - base
+        if max_depth < 1:
+            raise DepthError(self.max_depth)
+        stack = []
+        original = result = d
+        while True:
+            for key, value in items:
+                if value.__class__ in JSON_SCALARS or isinstance(
+                        value, (basestring, int, float, bool, NoneType)):
+                    continue
+                if isinstance(value, dict):
+                    new_items = value.iteritems()
+                elif isinstance(value, list):
+                    new_items = enumerate(value)
+                else:
+                    if isinstance(key, basestring) and key.startswith('@'):
+                        continue
+                    self.depth = base + len(stack) + 1
+                    new_value = self._dump_obj(value)
+                    self.depth = base
+                    if self.expand_nodes and base == 0 and (
+                            new_value is not value and '@type' in new_value):
+                        # the nested objects are expanded along with it;
+                        # a reference has no @type and is expanded
+                        # already, expanding it alone would drop it
+                        new_value = self._expand_node(new_value)
+                    if new_value is not value:
+                        if result is original and not inplace:
+                            result = copy_container(original)
+                        result[key] = new_value
+                    continue
+                if isinstance(key, basestring) and key.startswith('@'):
+                    continue
+                if len(stack) + 1 >= max_depth:
+                    raise DepthError(self.max_depth)
+                if budget is not None and isinstance(value, dict):
+                    budget.node()
+                stack.append((original, result, items, key))
+                original = result = value
+                items = new_items
+                break
+            else:
+                if not stack:
+                    return result
+                new_value = result
+                child = original
+                original, result, items, key = stack.pop()
+                if new_value is not child:
+                    if result is original and not inplace:
+                        result = copy_container(original)
+                    result[key] = new_value
 
-    def _dump_dict(self, d):
-        result = {}
-        for key, value in d.items():
-            if key.startswith('@'):
-                result[key] = value
-                continue
-            result[key] = self.dump(value)
-        return result
-
-    def _dump_list(self, l):
-        return [self.dump(item) for item in l]
+    def _expand_node(self, d):
+        expanded = jsonld.expand(
+            d, self.jv.jsonld_options(expandContext=self.context))
+        if not expanded:
+            return {}
+        return expanded[0]
 
     def _dump_obj(self, obj):
+        if self.classes:
+            # we are creating a cacheable dump, which depends on this
+            self.classes[-1].add(type(obj))
         if not self.jv.can_dump_node(obj):
             return obj
-        return self.dump(self.jv.dump_node(obj, self.extra))
+        if not self.references:
+            return self._dump_node(obj)
+        entry = self.ids.get(id(obj))
+        if entry is not None:
+            return {'@id': entry[0]}
+        result = self.jv.dump_node(obj, self.extra)
+        node_id = result.get('@id')
+        if node_id is None:
+            node_id = result['@id'] = '_:b%s' % len(self.ids)
+        # register before we descend so cycles become references
+        self.ids[id(obj)] = node_id, obj
+        return self.dump(result)
 
-    # XXX get rid of it and use _list always?
-    def _expanded(self, expanded, errors):
-        result = []
-        for d in expanded:
-            result.append(self._dict(d, errors))
-        return result
-
-    def _dict(self, d, errors):
-        result = {}
-        for term, l in d.items():
-            if not isinstance(l, list):
-                result[term] = l
-                continue
-            result[term] = self._list(term, l, errors)
-        return result
+    def _dump_node(self, obj):
+        jv = self.jv
+        if not self.classes and not jv.dump_cacheable(obj):
+            return self.dump(jv.dump_node(obj, self.extra))
+        entry = jv.cached_dump(obj)
+        if entry is not None:
+            result, classes = entry
+        else:
+            self.classes.append(set([type(obj)]))
+            try:
+                result = self.dump(jv.dump_node(obj, self.extra))
+            finally:
+                classes = frozenset(self.classes.pop())
+            if jv.dump_cacheable(obj):
+                jv.cache_dump(obj, result, classes)
+        if self.classes:
+            self.classes[-1].update(classes)
+        # the cache entry must not end up where it can be changed
+        return copy_json(result)
 
     def _list(self, term, l, errors):
-        result = []
-        for d in l:
-            if not isinstance(d, dict):
-                result.append(d)
-                continue
-            result.append(self._value(term, d, errors))
-        return result
-
-    def _value(self, term, d, errors):
-        type = d.get('@type')
-        if type is None:
-            return self._dict(d, errors)
-        value = d.get('@value')
-        if value is None:
-            return self._dict(d, errors)
-        d = d.copy()
-        try:
-            d['@value'] = self.jv.dump_value(term, type, value, self.extra)
-        except ValueDumpError, e:
-            errors.append(e)
-        return d
+        """Dump the values in a list of expanded values for term.
+        """
+        inplace = self.inplace
+        stack = []
+        original = result = l
+        items = enumerate(l)
+        # we walk the values in a list, and the lists in a node
+        is_list = True
+        while True:
+            for key, d in items:
+                if not is_list:
+                    if isinstance(d, list):
+                        stack.append((original, result, items, is_list, term,
+                                      key))
+                        original = result = d
+                        items = enumerate(d)
+                        is_list = True
+                        term = key
+                        break
+                    continue
+                if not isinstance(d, dict):
+                    continue
+                value = d.get('@value')
+                if value is None:
+                    self.nodes += 1
+                    stack.append((original, result, items, is_list, term, key))
+                    original = result = d
+                    items = d.iteritems()
+                    is_list = False
+                    break
+                self.values += 1
+                type = d.get('@type')
+                if type is None:
+                    continue
+                native = self.native
+                if (native is not None and isinstance(value, native) and
+                        self.jv.is_loaded_value(type, value, self.extra)):
+                    continue
+                try:
+                    new_value = self.jv.dump_value(term, type, value,
+                                                   self.extra)
+                except ValueDumpError, e:
+                    errors.append(e)
+                    if self.budget is not None:
+                        self.budget.check_errors(errors)
+                    continue
+                if new_value is value:
+                    continue
+                if inplace:
+                    d['@value'] = new_value
+                    continue
+                if result is original:
+                    result = list(original)
+                d = result[key] = d.copy()
+                d['@value'] = new_value
+            else:
+                if not stack:
+                    return result
+                new_value = result
+                child = original
+                original, result, items, is_list, term, key = stack.pop()
+                if new_value is not child:
+                    if result is original and not inplace:
+                        result = copy_container(original)
+                    result[key] = new_value
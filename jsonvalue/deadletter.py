@@ -0,0 +1,34 @@
+import json
+
+
+class DeadLetterFile(object):
+    """Dead letter sink that writes to a file.
+
+    Each rejected record is written as a line of JSON with its index
+    (or the name given by ``key``), its input and the error. Inputs
+    that are not strings are written as their ``repr``.
+    """
+    def __init__(self, fp, key='index'):
+        self.fp = fp
+        self.key = key
+
+    def __call__(self, index, raw, error):
+        if not isinstance(raw, basestring):
+            raw = repr(raw)
+        self.fp.write(json.dumps({
+            self.key: index,
+            'input': raw.rstrip('\r\n'),
+            'error': str(error),
+        }))
+        self.fp.write('\n')
+
+
+def dead_letter_sink(dead_letter):
+    """Return a callable for the dead_letter argument of a bulk call.
+
+    It may be a callable that gets the index, the input and the
+    error, a file to write to, or ``None``.
+    """
+    if dead_letter is None or not hasattr(dead_letter, 'write'):
+        return dead_letter
+    return DeadLetterFile(dead_letter)
@@ -9,6 +9,9 @@ class LoadError(Exception):
     def __init__(self, errors):
         self.errors = errors
 
+    def __str__(self):
+        return describe_errors(self.errors)
+
 
 class ValueDumpError(Exception):
     def __init__(self, term, type, value):
@@ -20,3 +23,50 @@ class ValueDumpError(Exception):
 class DumpError(Exception):
     def __init__(self, errors):
         self.errors = errors
+
+    def __str__(self):
+        return describe_errors(self.errors)
+
+
+def describe_errors(errors):
+    return ', '.join('%s: %r' % (error.term, error.value)
+                     for error in errors)
+
+
+class FrozenError(Exception):
+    """Raised when registering types on a frozen JsonValue.
+    """
+
+
+class LimitError(Exception):
+    """Raised when a load or dump call exceeds one of its limits.
+
+    ``limit`` is the name of the limit, ``value`` its value.
+    """
+    def __init__(self, limit, value):
+        Exception.__init__(self, limit, value)
+        self.limit = limit
+        self.value = value
+
+
+class DepthError(LimitError):
+    """Raised when a structure is nested deeper than allowed.
+    """
+    def __init__(self, max_depth):
+        LimitError.__init__(self, 'max_depth', max_depth)
+        self.max_depth = max_depth
+
+
+class LineError(Exception):
+    """Raised when a line of newline delimited JSON cannot be converted.
+
+    ``offset`` is the byte offset of the line in its file, ``error`` a
+    description of what went wrong.
+    """
+    def __init__(self, offset, error):
+        Exception.__init__(self, offset, error)
+        self.offset = offset
+        self.error = error
+
+    def __str__(self):
+        return 'line at byte offset %s: %s' % (self.offset, self.error)
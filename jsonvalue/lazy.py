@@ -0,0 +1,26 @@
+import importlib
+import threading
+
+
+class LazyModule(object):
+    """Stand-in for a module that is imported on first attribute access.
+
+    Attributes are copied onto the stand-in as they are looked up, so
+    only the first access of each goes through ``__getattr__``.
+    """
+    def __init__(self, name):
+        self._name = name
+        self._lock = threading.Lock()
+        self._module = None
+
+    def __getattr__(self, name):
+        module = self._module
+        if module is None:
+            with self._lock:
+                module = self._module
+                if module is None:
+                    module = self._module = importlib.import_module(
+                        self._name)
+        value = getattr(module, name)
+        setattr(self, name, value)
+        return value
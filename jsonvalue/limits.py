@@ -0,0 +1,70 @@
+from timeit import default_timer
+
+from .error import LimitError
+
+
+class Limits(object):
+    """Limits on the resources a single load or dump call may use.
+
+    Pass an instance as the ``limits`` argument of a load or dump
+    method. ``max_bytes`` limits the size of serialized input,
+    ``max_nodes`` the amount of JSON objects in the document,
+    ``max_depth`` its nesting depth (instead of the ``max_depth`` of
+    the JsonValue), ``max_errors`` the amount of value errors collected
+    before giving up and ``timeout`` the wall clock time of the call in
+    seconds. Limits that are ``None`` are not enforced.
+
+    A call that exceeds a limit raises
+    :class:`jsonvalue.error.LimitError`. The same instance can be used
+    for any amount of calls.
+    """
+    def __init__(self, max_bytes=None, max_nodes=None, max_depth=None,
+                 max_errors=None, timeout=None):
+        self.max_bytes = max_bytes
+        self.max_nodes = max_nodes
+        self.max_depth = max_depth
+        self.max_errors = max_errors
+        self.timeout = timeout
+
+    def start(self):
+        """Return the :class:`Budget` of a call that starts now.
+        """
+        return Budget(self)
+
+
+class Budget(object):
+    """What a single call has used of its limits so far.
+    """
+    def __init__(self, limits):
+        self.limits = limits
+        self.max_depth = limits.max_depth
+        self.nodes = 0
+        if limits.timeout is None:
+            self.deadline = None
+        else:
+            self.deadline = default_timer() + limits.timeout
+
+    def start(self):
+        # a call made on behalf of another one shares its budget
+        return self
+
+    def check_bytes(self, size):
+        max_bytes = self.limits.max_bytes
+        if max_bytes is not None and size > max_bytes:
+            raise LimitError('max_bytes', max_bytes)
+
+    def node(self):
+        self.nodes += 1
+        max_nodes = self.limits.max_nodes
+        if max_nodes is not None and self.nodes > max_nodes:
+            raise LimitError('max_nodes', max_nodes)
+        self.check_time()
+
+    def check_time(self):
+        if self.deadline is not None and default_timer() > self.deadline:
+            raise LimitError('timeout', self.limits.timeout)
+
+    def check_errors(self, errors):
+        max_errors = self.limits.max_errors
+        if max_errors is not None and len(errors) > max_errors:
+            raise LimitError('max_errors', max_errors)
@@ -0,0 +1,182 @@
+"""Convert large newline delimited JSON files in parallel.
+
+The input file is split into shards: byte ranges that start and end
+on line boundaries. Each shard is converted by a separate process,
+which loads every line with one context and dumps it again with
+another.
+"""
+import importlib
+import multiprocessing
+import os
+import shutil
+
+from .core import map_file, iter_lines
+from .compress import detect, MAGIC_SIZE
+from .deadletter import DeadLetterFile
+from .error import LoadError, DumpError, LimitError, LineError
+
+
+def convert_path(factory, path, output, load_context=None,
+                 dump_context=None, processes=None, shards=None,
+                 merge=True, dead_letter=None):
+    """Convert the newline delimited JSON file at path into output.
+
+    ``factory`` creates the :class:`jsonvalue.JsonValue` used by each
+    process. It is either a module level function or a
+    ``'module:name'`` string naming one, as it has to be available in
+    other processes. Each line is loaded with ``load_context`` and
+    dumped with ``dump_context``, which defaults to ``load_context``.
+
+    ``processes`` is the amount of worker processes, by default the
+    amount of CPUs; with 1 everything happens in this process.
+    ``shards`` is the amount of shards, by default the amount of
+    processes. If ``merge`` is true the converted shards are written
+    to output in order, otherwise shard ``i`` is left in
+    ``'%s.%d' % (output, i)``.
+
+    Compressed files cannot be split, so they are refused with a
+    ``ValueError``.
+
+    Returns the list of files written. Raises
+    :class:`jsonvalue.error.LineError` for the first line that cannot
+    be converted. If ``dead_letter`` is the path of a file, lines
+    that are not valid JSON or fail with a ``LoadError`` or
+    ``DumpError`` are written to it as lines of JSON with their byte
+    offset, input and error instead, and conversion continues. It is
+    split and merged like the output.
+    """
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    if shards is None:
+        shards = processes
+    if dump_context is None:
+        dump_context = load_context
+    with open(path, 'rb') as f:
+        format = detect(f.read(MAGIC_SIZE))
+    if format is not None:
+        raise ValueError("Cannot split %s compressed file %s" %
+                         (format, path))
+    tasks = [(factory, path, '%s.%d' % (output, i), start, end,
+              load_context, dump_context,
+              None if dead_letter is None else '%s.%d' % (dead_letter, i))
+             for i, (start, end) in enumerate(shard_ranges(path, shards))]
+    try:
+        if processes == 1:
+            shard_paths = map(convert_shard, tasks)
+        else:
+            pool = multiprocessing.Pool(processes)
+            try:
+                shard_paths = pool.map(convert_shard, tasks)
+            finally:
+                pool.terminate()
+    except LineError:
+        for task in tasks:
+            for shard_path in (task[2], task[-1]):
+                if shard_path is not None and os.path.exists(shard_path):
+                    os.remove(shard_path)
+        raise
+    if not merge:
+        return [p for shard in shard_paths for p in shard if p is not None]
+    merge_files([shard[0] for shard in shard_paths], output)
+    if dead_letter is None:
+        return [output]
+    merge_files([shard[1] for shard in shard_paths], dead_letter)
+    return [output, dead_letter]
+
+
+def merge_files(paths, output):
+    """Concatenate the files at paths into output, removing them.
+    """
+    with open(output, 'wb') as f:
+        for path in paths:
+            with open(path, 'rb') as shard:
+                shutil.copyfileobj(shard, f)
+            os.remove(path)
+
+
+def shard_ranges(path, shards):
+    """Split the file at path into at most shards byte ranges.
+
+    Returns a list of ``(start, end)`` tuples. Each range starts at
+    the start of a line and ends after a newline or at the end of the
+    file.
+    """
+    m = map_file(path)
+    if m is None:
+        return []
+    try:
+        size = len(m)
+        result = []
+        start = 0
+        for i in range(1, shards + 1):
+            end = size * i // shards
+            if end <= start:
+                continue
+            if end < size:
+                newline = m.find('\n', end - 1)
+                end = size if newline == -1 else newline + 1
+            result.append((start, end))
+            start = end
+        return result
+    finally:
+        m.close()
+
+
+def convert_shard(task):
+    """Convert one shard, writing the result to its own file.
+
+    Returns the paths of the output and dead letter file for the
+    shard.
+    """
+    (factory, path, output, start, end, load_context, dump_context,
+     dead_letter_path) = task
+    jv = get_jsonvalue(factory)
+    m = map_file(path)
+    dead_letter = None
+    try:
+        if dead_letter_path is not None:
+            dead_letter = DeadLetterFile(open(dead_letter_path, 'wb'),
+                                         'offset')
+        with open(output, 'wb') as f:
+            for offset, line in iter_lines(m, start, end):
+                try:
+                    obj = jv.loads(line, context=load_context)
+                    result = jv.dumps(obj, context=dump_context)
+                except (LoadError, DumpError, ValueError), e:
+                    # ValueError is what json raises for a malformed line
+                    if dead_letter is None:
+                        raise LineError(offset, str(e))
+                    dead_letter(offset, line, e)
+                    continue
+                except LimitError, e:
+                    raise LineError(offset, str(e))
+                f.write(result)
+                f.write('\n')
+    finally:
+        m.close()
+        if dead_letter is not None:
+            dead_letter.fp.close()
+    return output, dead_letter_path
+
+
+_jsonvalues = {}
+
+
+def get_jsonvalue(factory):
+    """Return the JsonValue made by factory, once for each process.
+    """
+    jv = _jsonvalues.get(factory)
+    if jv is None:
+        make = resolve(factory) if isinstance(factory, basestring) else factory
+        jv = _jsonvalues[factory] = make()
+    return jv
+
+
+def resolve(name):
+    """Return the object named by a ``'module:name'`` string.
+    """
+    module_name, attr = name.split(':', 1)
+    obj = importlib.import_module(module_name)
+    for part in attr.split('.'):
+        obj = getattr(obj, part)
+    return obj
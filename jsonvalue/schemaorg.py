@@ -1,6 +1,10 @@
-import isodate
 from datetime import datetime, date, time
 
+from .lazy import LazyModule
+from .vocabulary import LazyVocabulary
+
+isodate = LazyModule('isodate')
+
 
 class SchemaOrgType(object):
     @classmethod
@@ -132,3 +136,34 @@ DATA_TYPE_VOCABULARY = {}
 for t in [DataType, Boolean, Number, Float, Integer, Text,
           URL, Date, DateTime, Time]:
     DATA_TYPE_VOCABULARY[t.id()] = t
+
+# schema.org data types without handling of their own, with the data
+# type they behave like. They are only created when used.
+DATA_TYPE_BASES = {
+    'CssSelectorType': Text,
+    'PronounceableText': Text,
+    'XPathType': Text,
+}
+
+
+def data_type(iri):
+    """Return the schema.org data type for iri, or ``None``.
+    """
+    prefix, sep, name = iri.rpartition('/')
+    if prefix != 'http://schema.org':
+        return None
+    t = DATA_TYPE_VOCABULARY.get(iri)
+    if t is not None:
+        return t
+    base = DATA_TYPE_BASES.get(name)
+    if base is None:
+        return None
+    return type(str(name), (base,), {})
+
+
+# like DATA_TYPE_VOCABULARY, but types are registered on first use. It
+# has every schema.org data type. Schema.org types that are not data
+# types (Thing and the rest) describe nodes, which need a Python class
+# to load into; we do not ship generated classes for those, so they are
+# not in here. Register your own with a node vocabulary.
+VOCABULARY = LazyVocabulary(data_type)
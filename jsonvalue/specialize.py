@@ -0,0 +1,161 @@
+import threading
+import weakref
+
+from .error import ValueLoadError
+
+# the JSON values a specialized loader handles
+SCALARS = (str, unicode, int, long, float, bool)
+
+
+class Unspecialized(Exception):
+    """Raised by a specialized loader for input it cannot handle.
+
+    The generic load path should be used instead.
+    """
+
+
+class SpecializedLoader(object):
+    """A load function generated for a single context and registry.
+
+    It handles flat documents: a dict with only terms of the context as
+    keys and scalars or ``None`` as values. This is done without any
+    JSON-LD processing, as the term definitions and value types are
+    inlined into the generated function. ``source`` is the Python
+    source of that function.
+
+    Call it with the document, ``extra``, a list to append errors to, a
+    set to add type IRIs to, ``reject_unknown`` and ``native``, the
+    classes of values that may already be loaded. It raises
+    :class:`Unspecialized` for documents it cannot handle.
+    """
+    def __init__(self, source, namespace, type_iris):
+        self.source = source
+        self.type_iris = type_iris
+        code = compile(source, '<jsonvalue specialized loader>', 'exec')
+        exec code in namespace
+        self.load = namespace['load']
+
+    def __call__(self, d, extra, errors, types, reject_unknown, native=None):
+        return self.load(d, extra, errors, types, reject_unknown, native)
+
+
+def can_specialize(compiled):
+    if not compiled.simple:
+        return False
+    iris = [iri for iri, type in compiled.terms.values()]
+    # compaction would pick a single term for an IRI used more than once
+    return len(iris) == len(set(iris))
+
+
+def generate_source(compiled, value_types):
+    """Generate the source of a loader for compiled context.
+
+    ``value_types`` maps type IRI to registered value type. Returns the
+    source and the namespace it needs.
+    """
+    namespace = {
+        'MISSING': object(),
+        'SCALARS': frozenset(SCALARS),
+        'ValueLoadError': ValueLoadError,
+        'Unspecialized': Unspecialized,
+    }
+    lines = [
+        'def load(d, extra, errors, types, reject_unknown, native):',
+        '    result = {}',
+        '    seen = 0',
+        "    if '@context' in d:",
+        '        seen += 1',
+    ]
+    for i, term in enumerate(sorted(compiled.terms)):
+        iri, type = compiled.terms[term]
+        namespace['IRI_%s' % i] = iri
+        namespace['TYPE_%s' % i] = type
+        lines.extend([
+            '    value = d.get(%r, MISSING)' % term,
+            '    if value is not MISSING:',
+            '        seen += 1',
+            '        if value is not None:',
+        ])
+        t = value_types.get(type) if type is not None else None
+        if t is None:
+            lines.extend([
+                '            if value.__class__ not in SCALARS:',
+                '                raise Unspecialized()',
+            ])
+            if type is not None:
+                lines.append('            types.add(TYPE_%s)' % i)
+            lines.extend([
+                '            if reject_unknown:',
+                '                errors.append(',
+                '                    ValueLoadError(IRI_%s, TYPE_%s, value))'
+                % (i, i),
+                '            result[%r] = value' % term,
+            ])
+            continue
+        namespace['validate_%s' % i] = t.validate_load
+        namespace['validate_dump_%s' % i] = t.validate_dump
+        namespace['load_%s' % i] = t.load
+        lines.extend([
+            '            types.add(TYPE_%s)' % i,
+            '            if value.__class__ not in SCALARS:',
+            '                # a value that is loaded already',
+            '                if (native is None or',
+            '                        not isinstance(value, native) or',
+            '                        not validate_dump_%s(value, extra)):' % i,
+            '                    raise Unspecialized()',
+            '                result[%r] = value' % term,
+            '            elif not validate_%s(value, extra):' % i,
+            '                errors.append(',
+            '                    ValueLoadError(IRI_%s, TYPE_%s, value))'
+            % (i, i),
+            '            else:',
+            '                try:',
+            '                    result[%r] = load_%s(value, extra)'
+            % (term, i),
+            '                except ValueError:',
+            '                    errors.append(',
+            '                        ValueLoadError(IRI_%s, TYPE_%s, value))'
+            % (i, i),
+        ])
+    lines.extend([
+        '    if seen != len(d):',
+        '        # keys that are not terms of the context',
+        '        raise Unspecialized()',
+        '    return result',
+        '',
+    ])
+    return '\n'.join(lines), namespace
+
+
+class LoaderStore(object):
+    """Process-wide store of specialized loaders.
+
+    Loaders are keyed by context and the value types they use, so
+    JsonValue instances with the same context and types share them.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaders = weakref.WeakValueDictionary()
+
+    def get(self, compiled, value_types):
+        """Return loader for compiled context, or ``None``.
+        """
+        if not can_specialize(compiled):
+            return None
+        used = {}
+        for iri, type in compiled.terms.values():
+            t = value_types.get(type)
+            if t is not None:
+                used[type] = t
+        key = (compiled.key,
+               tuple(sorted((iri, id(t)) for iri, t in used.items())))
+        with self._lock:
+            loader = self._loaders.get(key)
+            if loader is None:
+                source, namespace = generate_source(compiled, used)
+                loader = self._loaders[key] = SpecializedLoader(
+                    source, namespace, compiled.type_iris)
+        return loader
+
+
+store = LoaderStore()
@@ -0,0 +1,118 @@
+import threading
+from timeit import default_timer
+
+
+class Stats(object):
+    """Statistics about a single load or dump call.
+
+    Pass an instance as the ``stats`` argument of a load or dump
+    method to have it filled in. ``timings`` maps a phase name to the
+    time spent in it in seconds. Load phases are ``specialized`` (the
+    specialized loader, if any), ``expand``, ``transform``,
+    ``node_compact`` (part of ``transform``), ``compact`` and
+    ``realize``. Dump phases are ``dump``, ``expand``, ``transform``
+    and ``compact``.
+    """
+    def __init__(self):
+        self.timings = {}
+        self.nodes = 0
+        self.values = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def timer(self, phase):
+        return Timer(self.timings, phase)
+
+    def count(self, nodes, values):
+        self.nodes += nodes
+        self.values += values
+
+
+class Timer(object):
+    def __init__(self, timings, phase):
+        self.timings = timings
+        self.phase = phase
+
+    def __enter__(self):
+        self.start = default_timer()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        elapsed = default_timer() - self.start
+        self.timings[self.phase] = self.timings.get(self.phase, 0.0) + elapsed
+
+
+class NullTimer(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        pass
+
+
+class NullStats(object):
+    """Stand-in used when no statistics are requested.
+    """
+    def timer(self, phase):
+        return NULL_TIMER
+
+    def count(self, nodes, values):
+        pass
+
+
+NULL_TIMER = NullTimer()
+NULL_STATS = NullStats()
+
+
+class Metrics(object):
+    """Counters and cumulative timings per type IRI.
+
+    Pass an instance as the ``metrics`` argument of
+    :class:`jsonvalue.JsonValue` to have every value and node
+    conversion recorded. Conversions are kept apart by kind:
+    ``load_value``, ``dump_value``, ``load_node``, ``load_many`` (a
+    batch of nodes) and ``dump_node``.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = {}
+
+    def measure(self, kind, iri, func, *args):
+        start = default_timer()
+        failed = True
+        try:
+            result = func(*args)
+            failed = False
+        finally:
+            self.record(kind, iri, default_timer() - start, failed)
+        return result
+
+    def record(self, kind, iri, elapsed, failed=False):
+        with self._lock:
+            entry = self._data.setdefault(kind, {}).get(iri)
+            if entry is None:
+                entry = self._data[kind][iri] = {
+                    'count': 0,
+                    'failures': 0,
+                    'time': 0.0
+                }
+            entry['count'] += 1
+            entry['time'] += elapsed
+            if failed:
+                entry['failures'] += 1
+
+    def snapshot(self):
+        """Return a copy of the collected metrics.
+
+        The result maps kind to a dict that maps type IRI to a dict
+        with ``count``, ``failures`` and ``time`` (in seconds).
+        """
+        with self._lock:
+            return dict(
+                (kind, dict((iri, entry.copy())
+                            for iri, entry in entries.items()))
+                for kind, entries in self._data.items())
+
+    def reset(self):
+        with self._lock:
+            self._data = {}
@@ -0,0 +1,9 @@
+import pytest
+from jsonvalue.tests.util import make_jv
+
+
+@pytest.fixture
+def jv():
+    """A JsonValue that knows the schema.org data types.
+    """
+    return make_jv()
@@ -0,0 +1,146 @@
+from jsonvalue import (JsonValue, ResultCache, CustomNodeType, valuetypes,
+                       schemaorg)
+from datetime import date
+
+
+CONTEXT = valuetypes(dict(a=schemaorg.Date))
+
+
+def test_result_cache():
+    cache = ResultCache()
+    jv = JsonValue(result_cache=cache)
+    jv.value_vocabulary(schemaorg.DATA_TYPE_VOCABULARY)
+
+    first = jv.loads('{"a": "2010-01-01"}', context=CONTEXT)
+    second = jv.loads('{"a": "2010-01-01"}', context=CONTEXT)
+    assert first == second == {'a': date(2010, 1, 1)}
+    # by default callers get their own copy
+    assert first is not second
+    first['a'] = None
+    assert jv.loads('{"a": "2010-01-01"}', context=CONTEXT) == {
+        'a': date(2010, 1, 1)}
+
+    # a different context is a different entry
+    assert jv.loads('{"a": "2010-01-01"}',
+                    context=valuetypes(dict(a=schemaorg.Text))) == {
+        'a': '2010-01-01'}
+
+    assert cache.info() == {
+        'hits': 2,
+        'misses': 2,
+        'evictions': 0,
+        'size': 2,
+        'maxsize': 128,
+    }
+
+
+def test_result_cache_shared():
+    cache = ResultCache(copy=False)
+    jv = JsonValue(result_cache=cache)
+    jv.value_vocabulary(schemaorg.DATA_TYPE_VOCABULARY)
+
+    first = jv.loads('{"a": "2010-01-01"}', context=CONTEXT)
+    assert jv.loads('{"a": "2010-01-01"}', context=CONTEXT) is first
+
+
+def test_result_cache_eviction():
+    cache = ResultCache(maxsize=2)
+    jv = JsonValue(result_cache=cache)
+    jv.value_vocabulary(schemaorg.DATA_TYPE_VOCABULARY)
+
+    jv.loads('{"a": "2010-01-01"}', context=CONTEXT)
+    jv.loads('{"a": "2010-01-02"}', context=CONTEXT)
+    # use the first so that the second is least recently used
+    jv.loads('{"a": "2010-01-01"}', context=CONTEXT)
+    jv.loads('{"a": "2010-01-03"}', context=CONTEXT)
+    assert len(cache) == 2
+    assert cache.evictions == 1
+
+    jv.loads('{"a": "2010-01-01"}', context=CONTEXT)
+    assert cache.hits == 2
+    jv.loads('{"a": "2010-01-02"}', context=CONTEXT)
+    assert cache.hits == 2
+
+
+def test_result_cache_invalidated_on_registration():
+    cache = ResultCache()
+    jv = JsonValue(result_cache=cache)
+
+    assert jv.loads('{"a": "2010-01-01"}', context=CONTEXT) == {
+        'a': '2010-01-01'}
+    jv.value_vocabulary(schemaorg.DATA_TYPE_VOCABULARY)
+    assert jv.loads('{"a": "2010-01-01"}', context=CONTEXT) == {
+        'a': date(2010, 1, 1)}
+
+
+def test_result_cache_keeps_unaffected_results():
+    cache = ResultCache()
+    jv = JsonValue(result_cache=cache)
+    jv.value_type(schemaorg.Date.id(), schemaorg.Date)
+
+    jv.loads('{"a": "2010-01-01"}', context=CONTEXT)
+    # a document with only unregistered types is returned as it is, so
+    # this needs a registered type to be cached at all
+    jv.loads('{"a": "2010-01-01", "t": "foo"}',
+             context=valuetypes(dict(a=schemaorg.Date, t=schemaorg.Text)))
+    assert len(cache) == 2
+
+    # the first result does not depend on Text, the second does
+    jv.value_type(schemaorg.Text.id(), schemaorg.Text)
+    assert len(cache) == 1
+    jv.loads('{"a": "2010-01-01"}', context=CONTEXT)
+    assert cache.hits == 1
+
+    jv.value_type(schemaorg.Date.id(), schemaorg.Date)
+    assert len(cache) == 0
+
+
+def test_dump_cache_invalidated_per_class():
+    jv = JsonValue()
+
+    dumped = []
+
+    class Address(object):
+        def __init__(self, city):
+            self.city = city
+
+    class User(object):
+        def __init__(self, name, address):
+            self.name = name
+            self.address = address
+
+    class Other(object):
+        pass
+
+    def dump_user(user, extra):
+        dumped.append(user.name)
+        return {'name': user.name, 'address': user.address}
+
+    context = {
+        'name': 'http://example.com/name',
+        'city': 'http://example.com/city',
+        'address': 'http://example.com/address',
+    }
+    user_node_type = CustomNodeType(User, dump_user, None, context,
+                                    cacheable=True)
+    jv.node_type(user_node_type.id(), user_node_type)
+    address_node_type = CustomNodeType(
+        Address, lambda address, extra: {'city': address.city}, None,
+        context)
+    jv.node_type(address_node_type.id(), address_node_type)
+
+    user = User('foo', Address('Amsterdam'))
+    jv.dump_objects(user, context=context)
+    assert dumped == ['foo']
+
+    other_node_type = CustomNodeType(
+        Other, lambda other, extra: {}, None, context)
+    jv.node_type(other_node_type.id(), other_node_type)
+    jv.dump_objects(user, context=context)
+    assert dumped == ['foo']
+
+    # the cached user depends on how addresses are dumped
+    jv.node_type(address_node_type.id(), address_node_type)
+    plain = jv.dump_objects(user, context=context)
+    assert dumped == ['foo', 'foo']
+    assert plain['address']['city'] == 'Amsterdam'
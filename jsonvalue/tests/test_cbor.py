@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+import pytest
+from datetime import date, datetime
+from jsonvalue import Stats, valuetypes, schemaorg, cbor
+from jsonvalue.error import DumpError, LoadError, DepthError
+
+
+@pytest.mark.parametrize('value', [
+    None, True, False, 0, 23, 24, 255, 256, 65536, 2 ** 32, 2 ** 64 - 1,
+    2 ** 64, 2 ** 100, -1, -24, -25, -2 ** 64, -2 ** 64 - 1, -2 ** 100,
+    1.5, -0.0, 1e300, u'', u'foo', u'\xe9€', [], [1, [2, [u'3']]],
+    {}, {u'a': {u'b': [None, True]}},
+    date(2010, 1, 1), date(1900, 1, 1),
+    datetime(2010, 1, 1, 12, 30), datetime(2010, 1, 1, 12, 30, 0, 123456),
+    datetime(1900, 1, 1),
+])
+def test_roundtrip(value):
+    assert cbor.loads(cbor.dumps(value)) == value
+
+
+def test_known_encodings():
+    # examples from RFC 7049 appendix A
+    assert cbor.dumps(0) == '\x00'
+    assert cbor.dumps(100) == '\x18\x64'
+    assert cbor.dumps(-1000) == '\x39\x03\xe7'
+    assert cbor.dumps(2 ** 64) == '\xc2\x49\x01' + '\x00' * 8
+    assert cbor.dumps(u'\xfc') == '\x62\xc3\xbc'
+    assert cbor.dumps([1, [2, 3]]) == '\x82\x01\x82\x02\x03'
+    assert cbor.dumps(datetime(2013, 3, 21, 20, 4)) == (
+        '\xc1\x1a\x51\x4b\x67\xb0')
+    # RFC 8943
+    assert cbor.dumps(date(1940, 10, 9)) == '\xd8\x64\x39\x29\xb3'
+
+
+def test_str_is_text():
+    assert cbor.loads(cbor.dumps('foo')) == u'foo'
+
+
+def test_aware_datetime():
+    value = schemaorg.isodate.parse_datetime('2010-01-01T12:00:00+02:00')
+    encoded = cbor.dumps(value)
+    assert encoded.startswith('\xc0')
+    loaded = cbor.loads(encoded)
+    assert loaded == value
+    assert loaded.utcoffset() == value.utcoffset()
+
+
+def test_decode():
+    assert cbor.loads('\xf9\x3c\x00') == 1.0
+    assert cbor.loads('\xf9\xc4\x00') == -4.0
+    assert cbor.loads('\xfa\x47\xc3\x50\x00') == 100000.0
+    assert cbor.loads('\x5f\x42\x01\x02\x41\x03\xff') == '\x01\x02\x03'
+    assert cbor.loads('\x7f\x62ab\x61c\xff') == u'abc'
+    assert cbor.loads('\x9f\x01\x82\x02\x03\xff') == [1, [2, 3]]
+    assert cbor.loads('\xbf\x61a\x01\xff') == {u'a': 1}
+    # unknown tags are dropped
+    assert cbor.loads('\xd8\x20\x61a') == u'a'
+
+
+@pytest.mark.parametrize('s', [
+    '', '\x18', '\x82\x01', '\x01\x02', '\xff', '\x81\xff', '\x1f',
+    '\xc1\x61a', '\xfc',
+    # nested tags
+    '\xc2' * 5000 + '\x40',
+    # an epoch out of range
+    '\xc1\x1b' + '\x7f' * 8, '\xd8\x64\x1b' + '\x7f' * 8,
+    '\xc1\xfb\x7f\xf0\x00\x00\x00\x00\x00\x00',
+    # a chunk of the wrong type in an indefinite length string
+    '\x7f\x01\xff', '\x5f\x61a\xff', '\x7f\x5f\xff\xff',
+    # unhashable map keys
+    '\xa1\x80\x01', '\xbf\xa0\x01\xff',
+    # a tag without a value
+    '\xc1\xff',
+])
+def test_invalid(s):
+    with pytest.raises(ValueError) as excinfo:
+        cbor.loads(s)
+    assert excinfo.type is ValueError
+
+
+def test_max_depth():
+    s = cbor.dumps([[[1]]])
+    assert cbor.loads(s, 3) == [[[1]]]
+    with pytest.raises(DepthError):
+        cbor.loads(s, 2)
+    # tags count too, but may tag a value at max_depth
+    s = cbor.dumps([[date(2010, 1, 1)]])
+    assert cbor.loads(s, 2) == [[date(2010, 1, 1)]]
+    with pytest.raises(DepthError):
+        cbor.loads(s, 1)
+    assert cbor.loads('\xd8\x20\xd8\x20\x61a', 1) == u'a'
+    with pytest.raises(DepthError):
+        cbor.loads('\xd8\x20' * 3 + '\x61a', 1)
+
+
+def test_not_serializable():
+    with pytest.raises(TypeError):
+        cbor.dumps(object())
+
+
+CONTEXT = valuetypes(dict(d=schemaorg.Date, dt=schemaorg.DateTime,
+                          i=schemaorg.Integer))
+CONTEXT['sub'] = 'http://example.com/sub'
+
+
+def test_dumpb_loadb(jv):
+    d = {'d': date(2010, 1, 1), 'dt': datetime(2010, 1, 1, 12, 0), 'i': 1}
+    b = jv.dumpb(d, context=CONTEXT)
+    # no strings are formatted
+    assert cbor.loads(b) == d
+    assert '2010' not in b
+    stats = Stats()
+    assert jv.loadb(b, context=CONTEXT, stats=stats) == d
+    # flat documents go through the specialized loader
+    assert set(stats.timings) == set(['specialized'])
+    assert stats.bytes_in == len(b)
+
+
+def test_dumpb_loadb_nested(jv):
+    d = {'sub': [{'d': date(2010, 1, 1)}, {'d': date(2010, 1, 2)}]}
+    b = jv.dumpb(d, context=CONTEXT)
+    assert jv.loadb(b, context=CONTEXT) == d
+    assert jv.freeze().loadb(b, context=CONTEXT) == d
+
+
+def test_loadb_strings(jv):
+    b = cbor.dumps({'d': '2010-01-01'})
+    assert jv.loadb(b, context=CONTEXT) == {'d': date(2010, 1, 1)}
+
+
+def test_dumpb_wrong_type(jv):
+    with pytest.raises(DumpError):
+        jv.dumpb({'d': datetime(2010, 1, 1)}, context=CONTEXT)
+
+
+def test_loadb_wrong_type(jv):
+    b = cbor.dumps({'d': datetime(2010, 1, 1)})
+    with pytest.raises(LoadError):
+        jv.loadb(b, context=CONTEXT)
+    b = cbor.dumps({'sub': {'d': datetime(2010, 1, 1)}})
+    with pytest.raises(LoadError):
+        jv.loadb(b, context=CONTEXT)
@@ -0,0 +1,149 @@
+import bz2
+import gzip
+import io
+import pytest
+import zlib
+from StringIO import StringIO
+from jsonvalue import Limits
+from jsonvalue.compress import (open_input, DecompressingReader,
+                                CompressingWriter)
+from jsonvalue.error import LimitError
+from jsonvalue.tests.util import CONTEXT
+from datetime import date
+
+
+LINES = ''.join('{"a": "2010-01-%02d"}\n' % day for day in range(1, 29))
+
+LOADED = [{'a': date(2010, 1, day)} for day in range(1, 29)]
+
+
+def gzip_compress(data):
+    f = StringIO()
+    with gzip.GzipFile(fileobj=f, mode='wb') as g:
+        g.write(data)
+    return f.getvalue()
+
+
+COMPRESS = [gzip_compress, bz2.compress]
+
+
+class Unseekable(object):
+    def __init__(self, data):
+        self.f = StringIO(data)
+
+    def read(self, size=-1):
+        return self.f.read(size)
+
+
+@pytest.mark.parametrize('compress', COMPRESS)
+def test_load(jv, compress):
+    fp = StringIO(compress('{"a": "2010-01-01"}'))
+    assert jv.load(fp, context=CONTEXT) == {'a': date(2010, 1, 1)}
+
+
+def test_load_uncompressed(jv):
+    fp = StringIO('{"a": "2010-01-01"}')
+    assert jv.load(fp, context=CONTEXT) == {'a': date(2010, 1, 1)}
+    fp = Unseekable('{"a": "2010-01-01"}')
+    assert jv.load(fp, context=CONTEXT) == {'a': date(2010, 1, 1)}
+
+
+@pytest.mark.parametrize('fp_class', [io.StringIO, StringIO, Unseekable])
+def test_load_text(jv, fp_class):
+    fp = fp_class(u'{"a": "2010-01-01"}')
+    assert jv.load(fp, context=CONTEXT) == {'a': date(2010, 1, 1)}
+    fp = fp_class(LINES.decode('ascii'))
+    assert list(jv.load_iter(fp, context=CONTEXT)) == LOADED
+
+
+def test_load_max_bytes(jv):
+    # the limit applies to the decompressed size
+    fp = StringIO(gzip_compress('{"a": "%s"}' % ('x' * 10000)))
+    with pytest.raises(LimitError):
+        jv.load(fp, context=CONTEXT, limits=Limits(max_bytes=1000))
+
+
+@pytest.mark.parametrize('compress', COMPRESS)
+def test_load_iter(jv, compress):
+    fp = StringIO(compress(LINES))
+    assert list(jv.load_iter(fp, context=CONTEXT)) == LOADED
+
+
+def test_load_iter_unseekable(jv):
+    fp = Unseekable(LINES)
+    assert list(jv.load_iter(fp, context=CONTEXT)) == LOADED
+
+
+@pytest.mark.parametrize('compress', COMPRESS)
+def test_load_path(jv, compress, tmpdir):
+    path = tmpdir.join('doc.json')
+    path.write(compress('{"a": "2010-01-01"}'), 'wb')
+    assert jv.load_path(str(path), context=CONTEXT) == {
+        'a': date(2010, 1, 1)}
+
+
+@pytest.mark.parametrize('compress', COMPRESS)
+def test_load_iter_path(jv, compress, tmpdir):
+    path = tmpdir.join('docs.json')
+    path.write(compress(LINES), 'wb')
+    assert list(jv.load_iter_path(str(path),
+                                  context=CONTEXT)) == LOADED
+
+
+@pytest.mark.parametrize('format', ['gzip', 'bz2'])
+def test_dump_roundtrip(jv, format):
+    f = StringIO()
+    jv.dump({'a': date(2010, 1, 1)}, f, context=CONTEXT, compress=format)
+    assert f.getvalue() != '{"a": "2010-01-01"}'
+    f.seek(0)
+    assert jv.load(f, context=CONTEXT) == {'a': date(2010, 1, 1)}
+
+
+@pytest.mark.parametrize('format', ['gzip', 'bz2'])
+def test_dump_iter_roundtrip(jv, format):
+    f = StringIO()
+    jv.dump_iter(LOADED, f, context=CONTEXT, compress=format)
+    f.seek(0)
+    assert list(jv.load_iter(f, context=CONTEXT)) == LOADED
+
+
+def test_dump_gzip_readable(jv):
+    f = StringIO()
+    jv.dump_iter(LOADED, f, context=CONTEXT, compress='gzip')
+    f.seek(0)
+    assert gzip.GzipFile(fileobj=f).read() == LINES
+
+
+def test_dump_unknown_format(jv):
+    with pytest.raises(ValueError):
+        jv.dump({}, StringIO(), compress='zip')
+
+
+@pytest.mark.parametrize('compress', COMPRESS)
+def test_concatenated_streams(compress):
+    data = compress('{"a": "2010-01-01"}\n') + compress('{"a": "2010-01-02"}')
+    reader = open_input(StringIO(data))
+    assert list(reader) == ['{"a": "2010-01-01"}\n', '{"a": "2010-01-02"}']
+
+
+def test_reader_small_chunks(monkeypatch):
+    monkeypatch.setattr('jsonvalue.compress.CHUNK_SIZE', 7)
+    data = ''.join('line %s\n' % i for i in range(1000))
+    reader = DecompressingReader(StringIO(bz2.compress(data)), 'bz2')
+    assert reader.readline() == 'line 0\n'
+    assert reader.read(7) == 'line 1\n'
+    assert list(reader) == data.splitlines(True)[2:]
+    assert reader.read() == ''
+
+
+def test_reader_invalid():
+    with pytest.raises(ValueError):
+        open_input(StringIO('\x1f\x8bnonsense')).read()
+
+
+def test_writer_unicode():
+    f = StringIO()
+    writer = CompressingWriter(f, 'gzip')
+    writer.write(u'\xe9')
+    writer.finish()
+    assert zlib.decompress(f.getvalue(), 16 + zlib.MAX_WBITS) == '\xc3\xa9'
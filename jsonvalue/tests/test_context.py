@@ -0,0 +1,100 @@
+from jsonvalue import JsonValue, valuetypes, schemaorg, core
+from jsonvalue.context import CompiledContext, ContextStore, context_key
+from datetime import date
+import gc
+
+
+def test_compiled_context_terms():
+    context = valuetypes(dict(a=schemaorg.Date))
+    context['sub'] = 'http://example.com/sub'
+    compiled = CompiledContext(context, context_key(context))
+    assert compiled.simple
+    assert compiled.terms == {
+        'a': ('http://jsonvalue.org/internal/id/a', schemaorg.Date.id()),
+        'sub': ('http://example.com/sub', None),
+    }
+    assert compiled.type_iris == frozenset([schemaorg.Date.id()])
+
+
+def test_compiled_context_not_simple():
+    context = {
+        'schema': 'http://schema.org/',
+        'name': 'schema:name',
+        'type': '@type',
+        'tags': {'@id': 'http://example.com/tags', '@container': '@list'},
+        'born': {'@id': 'http://example.com/born', '@type': 'schema:Date'},
+    }
+    compiled = CompiledContext(context, context_key(context))
+    assert not compiled.simple
+    assert compiled.terms == {
+        'schema': ('http://schema.org/', None),
+    }
+    assert compiled.type_iris == frozenset(['schema:Date'])
+
+    compiled = CompiledContext('http://example.com/context',
+                               context_key('http://example.com/context'))
+    assert not compiled.simple
+
+
+def test_compiled_context_none():
+    compiled = CompiledContext(None, context_key(None))
+    assert compiled.simple
+    assert compiled.terms == {}
+
+
+def test_context_store():
+    store = ContextStore()
+    context = valuetypes(dict(a=schemaorg.Date))
+
+    compiled = store.get(context)
+    assert store.get(dict(context)) is compiled
+    assert len(store) == 1
+
+    # the compiled context does not change with the original
+    context['b'] = 'http://example.com/b'
+    assert 'b' not in compiled.context
+
+    del compiled
+    gc.collect()
+    assert len(store) == 0
+
+
+def test_compiled_contexts_shared_between_instances():
+    jv1 = JsonValue()
+    jv2 = JsonValue()
+    context = valuetypes(dict(a=schemaorg.Date))
+
+    assert jv1.compile_context(context) is jv2.compile_context(
+        valuetypes(dict(a=schemaorg.Date)))
+
+
+def test_compile_context_by_identity(monkeypatch):
+    jv = JsonValue()
+    jv.value_vocabulary(schemaorg.DATA_TYPE_VOCABULARY)
+    context = valuetypes(dict(a=schemaorg.Date))
+    keys = []
+
+    def counting_context_key(context):
+        keys.append(context)
+        return context_key(context)
+    monkeypatch.setattr(core, 'context_key', counting_context_key)
+
+    for i in range(3):
+        assert jv.loads('{"a": "2010-01-01"}', context=context) == {
+            'a': date(2010, 1, 1)}
+    # serialized only once, after that it is found by identity
+    assert keys == [context]
+    # an equal context is found by content
+    assert jv.compile_context(dict(context)) is jv.compile_context(context)
+    assert len(keys) == 2
+
+    # a context changed in place is compiled again
+    context = {'b': 'http://example.com/b'}
+    assert jv.loads('{"g": "2010-01-01"}', context=context) == {
+        'g': '2010-01-01'}
+    context.update(valuetypes(dict(g=schemaorg.Date)))
+    assert jv.loads('{"g": "2010-01-01"}', context=context) == {
+        'g': date(2010, 1, 1)}
+    context['g']['@type'] = schemaorg.Text.id()
+    assert jv.loads('{"g": "2010-01-01"}', context=context) == {
+        'g': '2010-01-01'}
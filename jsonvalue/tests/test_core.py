@@ -1,6 +1,9 @@
 from jsonvalue import JsonValue, valuetypes, CustomNodeType, CustomValueType
-from jsonvalue import schemaorg, error
+from jsonvalue import schemaorg, error, core, Limits, Metrics
+from jsonvalue.core import LoadTransformer, DumpTransformer, LoadInfo
+from collections import OrderedDict, namedtuple
 from datetime import datetime, date, time
+import json
 import pytest
 
 
@@ -971,3 +974,871 @@ def test_extra_parameters():
     expected['foo'] = 'something(my request)'
     assert json_out == expected
 
+
+def test_transformers_share_unconverted():
+    jv = JsonValue()
+    jv.value_vocabulary(schemaorg.DATA_TYPE_VOCABULARY)
+
+    dump_transformer = DumpTransformer(jv, {}, {})
+    d = {'a': [1, {'b': 2}], 'c': {'d': 'x'}}
+    assert dump_transformer.dump(d) is d
+
+    load_transformer = LoadTransformer(jv, {}, False, {})
+    untyped = {'http://example.com/d': [{'@value': 'x'}]}
+    typed = {'@type': schemaorg.Date.id(), '@value': '2010-01-01'}
+    expanded = [{
+        'http://example.com/a': [typed],
+        'http://example.com/c': [untyped],
+    }]
+    loaded = load_transformer._list('_', expanded, LoadInfo())
+    assert loaded is not expanded
+    assert loaded[0]['http://example.com/a'][0]['@value'] == date(2010, 1, 1)
+    assert loaded[0]['http://example.com/c'][0] is untyped
+    # the input is left alone
+    assert typed['@value'] == '2010-01-01'
+
+
+def test_transformers_deeply_nested():
+    jv = JsonValue()
+    jv.value_vocabulary(schemaorg.DATA_TYPE_VOCABULARY)
+
+    # far deeper than the Python recursion limit
+    dump_transformer = DumpTransformer(jv, {}, {})
+    d = {'a': 1}
+    for i in range(5000):
+        d = {'a': [d]}
+    assert dump_transformer.dump(d) is d
+
+    load_transformer = LoadTransformer(jv, {}, False, {})
+    typed = {'@type': schemaorg.Date.id(), '@value': '2010-01-01'}
+    expanded = [{'http://example.com/a': [typed]}]
+    for i in range(5000):
+        expanded = [{'http://example.com/a': expanded}]
+    loaded = load_transformer._list('_', expanded, LoadInfo())
+    for i in range(5001):
+        loaded = loaded[0]['http://example.com/a']
+    assert loaded[0]['@value'] == date(2010, 1, 1)
+    assert typed['@value'] == '2010-01-01'
+
+
+def test_max_depth_load():
+    jv = JsonValue(max_depth=3)
+    context = {'a': 'http://example.com/a'}
+
+    assert jv.load_objects({'a': {'a': {'a': 1}}}, context=context) == {
+        'a': {'a': {'a': 1}}}
+    with pytest.raises(error.DepthError) as e:
+        jv.load_objects({'a': {'a': [{'a': 1}]}}, context=context)
+    assert e.value.max_depth == 3
+
+
+def test_max_depth_dump():
+    jv = JsonValue(max_depth=3)
+    context = {'a': 'http://example.com/a'}
+
+    assert jv.dump_objects({'a': {'a': {'a': 1}}}, context=context) == {
+        'a': {'a': {'a': 1}}}
+    with pytest.raises(error.DepthError):
+        jv.dump_objects({'a': {'a': [{'a': 1}]}}, context=context)
+
+
+def test_max_depth_passthrough():
+    jv = JsonValue()
+
+    # loads and dumps take a shortcut for documents without types
+    s = '{"a": ' * 150 + '1' + '}' * 150
+    with pytest.raises(error.DepthError):
+        jv.loads(s)
+    with pytest.raises(error.DepthError):
+        jv.loads('[' * 150 + ']' * 150)
+    d = {'a': 1}
+    for i in range(149):
+        d = {'a': d}
+    with pytest.raises(error.DepthError):
+        jv.dumps(d)
+    # too deep for json itself
+    for i in range(5000):
+        d = {'a': d}
+    with pytest.raises(error.DepthError):
+        jv.dumps(d)
+    # brackets in strings do not count
+    s = json.dumps({'a': '{' * 150})
+    assert jv.loads(s) == {'a': '{' * 150}
+    assert jv.dumps(json.loads(s)) == s
+
+
+def test_max_depth_dump_cycle():
+    jv = JsonValue()
+
+    class User(object):
+        def __init__(self, name):
+            self.name = name
+            self.friend = None
+
+    def dump_user(user, extra):
+        return {'name': user.name, 'friend': user.friend}
+
+    context = {
+        'name': 'http://example.com/name',
+        'friend': 'http://example.com/friend',
+    }
+    user_node_type = CustomNodeType(User, dump_user, None, context)
+    jv.node_type(user_node_type.id(), user_node_type)
+
+    foo = User('foo')
+    foo.friend = foo
+
+    # without references a cycle is infinitely deep
+    with pytest.raises(error.DepthError):
+        jv.dump_objects(foo, context=context)
+
+
+def test_load_expanded(monkeypatch):
+    jv = JsonValue()
+    jv.value_vocabulary(schemaorg.DATA_TYPE_VOCABULARY)
+
+    def fail(*args, **kw):
+        assert False, "should not be called"
+    monkeypatch.setattr(core.jsonld, 'expand', fail)
+
+    expanded = [{
+        'http://example.com/a': [
+            {'@type': schemaorg.Date.id(), '@value': '2010-01-01'}],
+        'http://example.com/b': [{'@value': 'x'}],
+    }]
+    assert jv.load_expanded(expanded) == [{
+        'http://example.com/a': [
+            {'@type': schemaorg.Date.id(), '@value': date(2010, 1, 1)}],
+        'http://example.com/b': [{'@value': 'x'}],
+    }]
+    # a single node object is fine too
+    assert jv.load_expanded(expanded[0]) == {
+        'http://example.com/a': [
+            {'@type': schemaorg.Date.id(), '@value': date(2010, 1, 1)}],
+        'http://example.com/b': [{'@value': 'x'}],
+    }
+    with pytest.raises(error.LoadError):
+        jv.load_expanded([{'http://example.com/a': [
+            {'@type': schemaorg.Date.id(), '@value': 'wrong'}]}])
+
+
+def test_dump_expanded(monkeypatch):
+    jv = JsonValue()
+    jv.value_vocabulary(schemaorg.DATA_TYPE_VOCABULARY)
+
+    def fail(*args, **kw):
+        assert False, "should not be called"
+    monkeypatch.setattr(core.jsonld, 'compact', fail)
+
+    expanded = [{
+        'http://example.com/a': [
+            {'@type': schemaorg.Date.id(), '@value': date(2010, 1, 1)}],
+    }]
+    assert jv.dump_expanded(expanded) == [{
+        'http://example.com/a': [
+            {'@type': schemaorg.Date.id(), '@value': '2010-01-01'}],
+    }]
+    # the input is left alone
+    assert expanded[0]['http://example.com/a'][0]['@value'] == date(
+        2010, 1, 1)
+    with pytest.raises(error.DumpError):
+        jv.dump_expanded([{'http://example.com/a': [
+            {'@type': schemaorg.Date.id(), '@value': 'wrong'}]}])
+
+
+def test_expanded_nodes():
+    jv = JsonValue()
+    jv.value_vocabulary(schemaorg.DATA_TYPE_VOCABULARY)
+
+    class User(object):
+        def __init__(self, name, born):
+            self.name = name
+            self.born = born
+
+    context = valuetypes(dict(born=schemaorg.Date))
+    context['name'] = 'http://example.com/name'
+    context['user'] = 'http://example.com/user'
+    user_node_type = CustomNodeType(
+        User,
+        lambda user, extra: {'name': user.name, 'born': user.born},
+        lambda d, extra: User(d['name'], d['born']),
+        context)
+    jv.node_type(user_node_type.id(), user_node_type)
+
+    expanded = [{
+        'http://example.com/user': [{
+            '@type': [user_node_type.id()],
+            'http://example.com/name': [{'@value': 'foo'}],
+            'http://jsonvalue.org/internal/id/born': [{
+                '@type': schemaorg.Date.id(),
+                '@value': '2010-01-01'}],
+        }]
+    }]
+    loaded = jv.load_expanded(expanded)
+    user = loaded[0]['http://example.com/user'][0]
+    assert isinstance(user, User)
+    assert user.name == 'foo'
+    assert user.born == date(2010, 1, 1)
+
+    assert jv.dump_expanded(loaded, context=context) == expanded
+
+    user_iri = 'http://example.com/user'
+    dumped = jv.dump_expanded([{user_iri: [user, user]}], context=context,
+                              references=True)
+    assert dumped[0][user_iri][0]['@id'] == '_:b0'
+    assert dumped[0][user_iri][1] == {'@id': '_:b0'}
+    loaded = jv.load_expanded(dumped)
+    assert loaded[0][user_iri][1] is loaded[0][user_iri][0]
+
+    # a custom object on its own is expanded as well
+    assert jv.dump_expanded(user, context=context) == expanded[0][user_iri][0]
+
+
+def test_passthrough(monkeypatch):
+    jv = JsonValue()
+    jv.value_vocabulary(schemaorg.DATA_TYPE_VOCABULARY)
+
+    def fail(*args, **kw):
+        assert False, "should not be called"
+    monkeypatch.setattr(core.jsonld, 'expand', fail)
+
+    d = {'a': 1, 'b': {'c': [1]}}
+    assert jv.load_objects(d) is d
+    assert jv.dump_objects(d) is d
+    # a context without registered types does not need conversion
+    context = {'a': 'http://example.com/a',
+               'b': {'@id': 'http://example.com/b',
+                     '@type': 'http://example.com/Unknown'}}
+    assert jv.load_objects(d, context=context) is d
+    assert jv.dump_objects(d, context=context) is d
+    d = {'a': 1, '@context': context}
+    assert jv.load_objects(d) is d
+
+    s = '{"a": 1, "b": {"c": [1]}}'
+    assert jv.loads(s, context=context) == json.loads(s)
+    assert jv.dumps(json.loads(s), context=context) == s
+
+
+def test_no_passthrough():
+    jv = JsonValue()
+    jv.value_vocabulary(schemaorg.DATA_TYPE_VOCABULARY)
+
+    class User(object):
+        def __init__(self, name):
+            self.name = name
+
+    context = {'name': 'http://example.com/name'}
+    user_node_type = CustomNodeType(
+        User,
+        lambda user, extra: {'name': user.name},
+        lambda d, extra: User(d['name']),
+        context)
+    jv.node_type(user_node_type.id(), user_node_type)
+
+    # the @type is found even if escaped
+    s = '{"name": "foo", "\\u0040type": "%s"}' % user_node_type.id()
+    assert json.loads(s)['@type'] == user_node_type.id()
+    loaded = jv.loads(s, context=context)
+    assert isinstance(loaded, User)
+    assert jv.dump_objects(loaded, context=context) == {
+        '@type': user_node_type.id(), 'name': 'foo'}
+    context = dict(context, user='http://example.com/user')
+    assert json.loads(jv.dumps({'name': 'bar', 'user': loaded},
+                               context=context)) == {
+        'name': 'bar',
+        'user': {'@type': user_node_type.id(), 'name': 'foo'}}
+    # with a registered type in the context values are converted
+    assert jv.load_objects({'a': '2010-01-01'},
+                           context=valuetypes(dict(a=schemaorg.Date))) == {
+        'a': date(2010, 1, 1)}
+    # reject_unknown needs to see the values
+    with pytest.raises(error.LoadError):
+        jv.load_objects({'name': 'foo'}, context=context,
+                        reject_unknown=True)
+
+
+def test_no_passthrough_nested_context():
+    jv = JsonValue()
+    jv.value_vocabulary(schemaorg.DATA_TYPE_VOCABULARY)
+    jv.context_url('http://example.com/dates',
+                   valuetypes(dict(a=schemaorg.Date)))
+
+    # only the nested context has a registered type
+    s = json.dumps({
+        '@context': {'sub': 'http://example.com/sub'},
+        'sub': {'@context': 'http://example.com/dates', 'a': '2010-01-01'},
+    })
+    loaded = jv.loads(s)
+    # compacted with the outer context, which does not know the term
+    assert loaded['sub'] == {
+        'http://jsonvalue.org/internal/id/a': {
+            '@type': schemaorg.Date.id(), '@value': date(2010, 1, 1)}}
+
+
+def test_no_passthrough_json_node():
+    jv = JsonValue()
+
+    Point = namedtuple('Point', ['x', 'y'])
+    context = {
+        'x': 'http://example.com/x',
+        'y': 'http://example.com/y',
+        'point': 'http://example.com/point',
+    }
+    point_node_type = CustomNodeType(
+        Point,
+        lambda point, extra: {'x': point.x, 'y': point.y},
+        lambda d, extra: Point(d['x'], d['y']),
+        context)
+    jv.node_type(point_node_type.id(), point_node_type)
+
+    # json would serialize the namedtuple as a list
+    s = jv.dumps({'point': Point(1, 2)}, context=context)
+    assert json.loads(s) == {
+        'point': {'@type': point_node_type.id(), 'x': 1, 'y': 2}}
+    assert jv.loads(s, context=context) == {'point': Point(1, 2)}
+    # plain documents still are
+    assert jv.dumps({'x': [1, 2]}, context=context) == '{"x": [1, 2]}'
+
+
+def test_load_many():
+    jv = JsonValue()
+
+    class User(object):
+        def __init__(self, name):
+            self.name = name
+
+    batches = []
+
+    def load_users(dicts, extra):
+        batches.append([d['name'] for d in dicts])
+        return [User(d['name']) for d in dicts]
+
+    def load_user(d, extra):
+        assert False, "load_many should be used"
+
+    context = {
+        'name': 'http://example.com/name',
+        'users': 'http://example.com/users',
+    }
+    user_node_type = CustomNodeType(User, None, load_user, context,
+                                    load_many=load_users)
+    jv.node_type(user_node_type.id(), user_node_type)
+
+    loaded = jv.load_objects({'users': [
+        {'@type': user_node_type.id(), 'name': 'a'},
+        {'@type': user_node_type.id(), 'name': 'b', '@id': 'http://b'},
+        {'@id': 'http://b'},
+        {'@type': user_node_type.id(), 'name': 'c'},
+    ]}, context=context)
+    assert [user.name for user in loaded['users']] == ['a', 'b', 'b', 'c']
+    assert loaded['users'][1] is loaded['users'][2]
+    # a single call, and the node with an @id is only loaded once
+    assert batches == [['a', 'b', 'c']]
+
+    frozen = jv.freeze()
+    del batches[:]
+    loaded = frozen.load_objects({'users': [
+        {'@type': user_node_type.id(), 'name': 'a'},
+        {'@type': user_node_type.id(), 'name': 'b'},
+    ]}, context=context)
+    assert [user.name for user in loaded['users']] == ['a', 'b']
+    assert batches == [['a', 'b']]
+
+
+def test_load_many_nested():
+    jv = JsonValue()
+
+    class User(object):
+        def __init__(self, name):
+            self.name = name
+
+    class Group(object):
+        def __init__(self, users):
+            self.users = users
+
+    batches = []
+
+    def load_users(dicts, extra):
+        batches.append(len(dicts))
+        return [User(d['name']) for d in dicts]
+
+    context = {
+        'name': 'http://example.com/name',
+        'users': {'@id': 'http://example.com/users', '@container': '@list'},
+        'groups': 'http://example.com/groups',
+    }
+    user_node_type = CustomNodeType(User, None, None, context,
+                                    load_many=load_users)
+    jv.node_type(user_node_type.id(), user_node_type)
+    group_node_type = CustomNodeType(
+        Group, None, lambda d, extra: Group(d['users']), context)
+    jv.node_type(group_node_type.id(), group_node_type)
+
+    loaded = jv.load_objects({'groups': [
+        {'@type': group_node_type.id(), 'users': [
+            {'@type': user_node_type.id(), 'name': 'a'},
+            {'@type': user_node_type.id(), 'name': 'b'}]},
+        {'@type': group_node_type.id(), 'users': [
+            {'@type': user_node_type.id(), 'name': 'c'}]},
+    ]}, context=context)
+    # a group needs its users, so all users are loaded before the groups
+    assert batches == [3]
+    assert [[user.name for user in group.users]
+            for group in loaded['groups']] == [['a', 'b'], ['c']]
+
+
+def test_load_many_levels():
+    jv = JsonValue()
+
+    class User(object):
+        def __init__(self, name):
+            self.name = name
+
+    batches = []
+
+    def load_users(dicts, extra):
+        batches.append(sorted(d['name'] for d in dicts))
+        return [User(d['name']) for d in dicts]
+
+    def load_group(d, extra):
+        if d.get('name') == 'unloaded':
+            return None
+        return d['members']
+
+    context = {
+        'name': 'http://example.com/name',
+        'members': {'@id': 'http://example.com/members',
+                    '@container': '@list'},
+        'groups': {'@id': 'http://example.com/groups',
+                   '@container': '@list'},
+    }
+    user_node_type = CustomNodeType(User, None, None, context,
+                                    load_many=load_users)
+    jv.node_type(user_node_type.id(), user_node_type)
+    group_node_type = CustomNodeType(dict, None, load_group, context)
+    jv.node_type(group_node_type.id(), group_node_type)
+
+    def user(name):
+        return {'@type': user_node_type.id(), 'name': name}
+
+    def group(name, *members):
+        return {'@type': group_node_type.id(), 'name': name,
+                'members': list(members)}
+
+    loaded = jv.load_objects({'groups': [
+        user('a'),
+        group('g1', user('b'), group('g2', user('c'))),
+        group('unloaded', user('d')),
+    ]}, context=context)
+    # users at any depth are of the same level, so in the same batch
+    assert batches == [['a', 'b', 'c', 'd']]
+    a, g1, unloaded = loaded['groups']
+    assert a.name == 'a'
+    assert g1[0].name == 'b'
+    assert g1[1][0].name == 'c'
+    # a node its type does not load is kept, with its nodes loaded
+    assert unloaded['name'] == 'unloaded'
+    assert unloaded['members'][0].name == 'd'
+
+
+def test_load_objects_inplace():
+    jv = JsonValue()
+    jv.value_vocabulary(schemaorg.DATA_TYPE_VOCABULARY)
+
+    d = dict(a=True, g='2010-10-01')
+    values = jv.load_objects(d, context=SCHEMA_ORG_DATA_TYPES_CONTEXT,
+                             inplace=True)
+    assert values is d
+    assert d == dict(a=True, g=date(2010, 10, 1))
+
+
+@pytest.mark.parametrize('metrics', [None, Metrics()])
+def test_load_objects_inplace_error(metrics):
+    # with metrics the generic path is taken
+    jv = JsonValue(metrics=metrics)
+    jv.value_vocabulary(schemaorg.DATA_TYPE_VOCABULARY)
+
+    d = dict(a=True, g='not a date')
+    with pytest.raises(error.LoadError):
+        jv.load_objects(d, context=SCHEMA_ORG_DATA_TYPES_CONTEXT,
+                        inplace=True)
+    assert d == dict(a=True, g='not a date')
+    with pytest.raises(error.LimitError):
+        jv.load_objects(d, context=SCHEMA_ORG_DATA_TYPES_CONTEXT,
+                        inplace=True, limits=Limits(max_nodes=0))
+    assert d == dict(a=True, g='not a date')
+
+
+def test_dump_objects_inplace():
+    jv = JsonValue()
+
+    class User(object):
+        def __init__(self, name):
+            self.name = name
+
+    context = {
+        'name': 'http://example.com/name',
+        'users': 'http://example.com/users',
+    }
+    user_node_type = CustomNodeType(
+        User,
+        lambda user, extra: {'name': user.name},
+        lambda d, extra: User(d['name']),
+        context)
+    jv.node_type(user_node_type.id(), user_node_type)
+
+    users = [User('foo'), User('bar')]
+    d = {'users': users}
+    plain = jv.dump_objects(d, context=context, inplace=True)
+    expected = [
+        {'@type': user_node_type.id(), 'name': 'foo'},
+        {'@type': user_node_type.id(), 'name': 'bar'},
+    ]
+    assert plain == {'users': expected}
+    # the users list was changed in place
+    assert d['users'] is users
+    assert users == expected
+
+
+def test_load_node_identity():
+    jv = JsonValue()
+
+    loaded = []
+
+    class User(object):
+        def __init__(self, name):
+            self.name = name
+
+    def load_user(d, extra):
+        loaded.append(d['name'])
+        return User(d['name'])
+
+    context = {
+        'name': 'http://example.com/name',
+        'author': 'http://example.com/author',
+        'editor': 'http://example.com/editor',
+        'reviewers': 'http://example.com/reviewers',
+    }
+    user_node_type = CustomNodeType(
+        User,
+        lambda user, extra: {'name': user.name},
+        load_user,
+        context)
+    jv.node_type(user_node_type.id(), user_node_type)
+
+    user = {
+        '@id': 'http://example.com/users/foo',
+        '@type': user_node_type.id(),
+        'name': 'foo',
+    }
+    values = jv.load_objects({
+        'author': user,
+        'editor': user,
+        'reviewers': [
+            {'@id': 'http://example.com/users/foo'},
+            {
+                '@id': 'http://example.com/users/bar',
+                '@type': user_node_type.id(),
+                'name': 'bar',
+            }
+        ]
+    }, context=context)
+
+    assert loaded == ['foo', 'bar']
+    assert isinstance(values['author'], User)
+    assert values['editor'] is values['author']
+    assert values['reviewers'][0] is values['author']
+    assert values['reviewers'][1].name == 'bar'
+
+
+def test_load_reference_before_node():
+    jv = JsonValue()
+
+    class User(object):
+        def __init__(self, name):
+            self.name = name
+
+    context = {
+        'name': 'http://example.com/name',
+        'first': 'http://example.com/first',
+        'second': 'http://example.com/second',
+    }
+    user_node_type = CustomNodeType(
+        User,
+        lambda user, extra: {'name': user.name},
+        lambda d, extra: User(d['name']),
+        context)
+    jv.node_type(user_node_type.id(), user_node_type)
+
+    foo = User('foo')
+    # the full node is dumped for whichever key comes first, which need
+    # not be the one loaded first
+    for keys in [('first', 'second'), ('second', 'first')]:
+        d = OrderedDict((key, foo) for key in keys)
+        plain = jv.dump_objects(d, context=context, references=True)
+        values = jv.load_objects(plain, context=context)
+        assert isinstance(values['first'], User)
+        assert values['first'].name == 'foo'
+        assert values['second'] is values['first']
+
+
+def test_dump_references():
+    jv = JsonValue()
+
+    dumped = []
+
+    class User(object):
+        def __init__(self, name, friend=None):
+            self.name = name
+            self.friend = friend
+
+    def dump_user(user, extra):
+        dumped.append(user.name)
+        result = {'name': user.name}
+        if user.friend is not None:
+            result['friend'] = user.friend
+        return result
+
+    def load_user(d, extra):
+        return User(d['name'], d.get('friend'))
+
+    context = {
+        'name': 'http://example.com/name',
+        'friend': 'http://example.com/friend',
+        'users': 'http://example.com/users',
+    }
+    user_node_type = CustomNodeType(User, dump_user, load_user, context)
+    jv.node_type(user_node_type.id(), user_node_type)
+
+    foo = User('foo')
+    bar = User('bar', foo)
+    plain = jv.dump_objects({'users': [foo, bar, foo]}, context=context,
+                            references=True)
+
+    assert dumped == ['foo', 'bar']
+    assert plain == {
+        'users': [
+            {'@id': '_:b0', '@type': user_node_type.id(), 'name': 'foo'},
+            {'@id': '_:b1', '@type': user_node_type.id(), 'name': 'bar',
+             'friend': {'@id': '_:b0'}},
+            {'@id': '_:b0'},
+        ]
+    }
+
+    values = jv.load_objects(plain, context=context)
+    foo2, bar2, foo3 = values['users']
+    assert foo2.name == 'foo'
+    assert bar2.friend is foo2
+    assert foo3 is foo2
+
+
+def test_dump_references_cycle():
+    jv = JsonValue()
+
+    class User(object):
+        def __init__(self, name):
+            self.name = name
+            self.friend = None
+
+    def dump_user(user, extra):
+        return {'name': user.name, 'friend': user.friend}
+
+    context = {
+        'name': 'http://example.com/name',
+        'friend': 'http://example.com/friend',
+    }
+    user_node_type = CustomNodeType(User, dump_user, None, context)
+    jv.node_type(user_node_type.id(), user_node_type)
+
+    foo = User('foo')
+    bar = User('bar')
+    foo.friend = bar
+    bar.friend = foo
+
+    plain = jv.dump_objects(foo, context=context, references=True)
+    assert plain == {
+        '@id': '_:b0',
+        '@type': user_node_type.id(),
+        'name': 'foo',
+        'friend': {
+            '@id': '_:b1',
+            '@type': user_node_type.id(),
+            'name': 'bar',
+            'friend': {'@id': '_:b0'}
+        }
+    }
+
+
+def test_dump_references_temporary_nodes():
+    jv = JsonValue()
+
+    class User(object):
+        def __init__(self, city):
+            self.city = city
+
+    class Address(object):
+        def __init__(self, city):
+            self.city = city
+
+    def dump_user(user, extra):
+        # a new Address each time, gone as soon as it is dumped
+        return {'address': Address(user.city)}
+
+    def dump_address(address, extra):
+        return {'city': address.city}
+
+    context = {
+        'address': 'http://example.com/address',
+        'city': 'http://example.com/city',
+        'users': 'http://example.com/users',
+    }
+    user_node_type = CustomNodeType(User, dump_user, None, context)
+    jv.node_type(user_node_type.id(), user_node_type)
+    address_node_type = CustomNodeType(Address, dump_address, None, context)
+    jv.node_type(address_node_type.id(), address_node_type)
+
+    cities = ['a', 'b', 'c', 'd']
+    plain = jv.dump_objects({'users': [User(city) for city in cities]},
+                            context=context, references=True)
+
+    assert [user['address']['city'] for user in plain['users']] == cities
+
+
+def test_dump_cacheable_node():
+    jv = JsonValue()
+
+    dumped = []
+
+    class User(object):
+        def __init__(self, name):
+            self.name = name
+
+    def dump_user(user, extra):
+        dumped.append(user.name)
+        return {'name': user.name}
+
+    context = {
+        'name': 'http://example.com/name',
+    }
+    user_node_type = CustomNodeType(User, dump_user, None, context,
+                                    cacheable=True)
+    jv.node_type(user_node_type.id(), user_node_type)
+
+    user = User('foo')
+    expected = {'@type': user_node_type.id(), 'name': 'foo'}
+    assert jv.dump_objects(user, context=context) == expected
+    assert jv.dump_objects(user, context=context) == expected
+    assert dumped == ['foo']
+
+    jv.invalidate_dump(user)
+    assert jv.dump_objects(user, context=context) == expected
+    assert dumped == ['foo', 'foo']
+
+    # changing the output does not change the cache entry
+    d = {'users': [user]}
+    jv.dump_objects(d, context=context, inplace=True)
+    d['users'][0]['name'] = 'changed'
+    assert jv.dump_objects(user, context=context) == expected
+    assert jv.dump_expanded(user, context=context)[
+        'http://example.com/name'] == [{'@value': 'foo'}]
+
+    # the cache entry goes away with the object
+    assert len(jv._dump_cache) == 1
+    del user
+    assert len(jv._dump_cache) == 0
+
+
+def test_dump_node_not_cacheable():
+    jv = JsonValue()
+
+    class User(object):
+        def __init__(self, name):
+            self.name = name
+
+    context = {
+        'name': 'http://example.com/name',
+    }
+    user_node_type = CustomNodeType(
+        User, lambda user, extra: {'name': user.name}, None, context)
+    jv.node_type(user_node_type.id(), user_node_type)
+
+    user = User('foo')
+    assert jv.dump_objects(user, context=context)['name'] == 'foo'
+    user.name = 'bar'
+    assert jv.dump_objects(user, context=context)['name'] == 'bar'
+
+
+def test_freeze():
+    jv = JsonValue()
+    jv.value_vocabulary(schemaorg.DATA_TYPE_VOCABULARY)
+
+    class User(object):
+        def __init__(self, name, born):
+            self.name = name
+            self.born = born
+
+    context = {
+        'name': {
+            '@id': 'http://example.com/name',
+            '@type': schemaorg.Text.id(),
+        },
+        'born': {
+            '@id': 'http://example.com/born',
+            '@type': schemaorg.Date.id(),
+        },
+    }
+    user_node_type = CustomNodeType(
+        User,
+        lambda user, extra: {'name': user.name, 'born': user.born},
+        lambda d, extra: User(d['name'], d['born']),
+        context)
+    jv.node_type(user_node_type.id(), user_node_type)
+
+    frozen = jv.freeze()
+
+    with pytest.raises(error.FrozenError):
+        frozen.value_type('http://example.com/x', schemaorg.Text)
+    with pytest.raises(error.FrozenError):
+        frozen.node_type(user_node_type.id(), user_node_type)
+
+    json = {
+        '@type': user_node_type.id(),
+        'name': 'foo',
+        'born': '2010-01-01',
+    }
+    user = frozen.load_objects(json, context=context)
+    assert user.name == 'foo'
+    assert user.born == date(2010, 1, 1)
+    assert frozen.dump_objects(user, context=context) == json
+
+    with pytest.raises(error.LoadError):
+        frozen.load_objects(dict(json, born='wrong'), context=context)
+
+    # later registrations on the original do not affect the frozen copy
+    jv.value_type('http://example.com/x', schemaorg.Text)
+    assert not frozen.can_load_value('http://example.com/x')
+
+
+def test_freeze_threads():
+    import threading
+
+    jv = JsonValue()
+    jv.value_vocabulary(schemaorg.DATA_TYPE_VOCABULARY)
+    frozen = jv.freeze()
+
+    failures = []
+
+    def work(i):
+        d = date(2010, 1, i + 1)
+        for _ in range(20):
+            s = frozen.dumps({'g': d}, context=SCHEMA_ORG_DATA_TYPES_CONTEXT)
+            values = frozen.loads(s, context=SCHEMA_ORG_DATA_TYPES_CONTEXT)
+            if values != {'g': d}:
+                failures.append(values)
+
+    threads = [threading.Thread(target=work, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert failures == []
@@ -0,0 +1,77 @@
+import json
+import pytest
+from StringIO import StringIO
+from jsonvalue.error import LoadError, DumpError
+from jsonvalue.tests.util import CONTEXT
+from datetime import date
+
+
+LINES = '{"a": "2010-01-01"}\n\n{"a": "wrong"}\n{"a": "2010-01-03"}\n'
+
+
+def test_load_iter_without_dead_letter(jv):
+    loaded = jv.load_iter(StringIO(LINES), context=CONTEXT)
+    assert next(loaded) == {'a': date(2010, 1, 1)}
+    with pytest.raises(LoadError):
+        next(loaded)
+
+
+def test_load_iter_dead_letter(jv):
+    dead = []
+    loaded = jv.load_iter(
+        StringIO(LINES), context=CONTEXT,
+        dead_letter=lambda index, raw, e: dead.append((index, raw, e)))
+    assert list(loaded) == [{'a': date(2010, 1, 1)}, {'a': date(2010, 1, 3)}]
+    [(index, raw, e)] = dead
+    assert index == 1
+    assert raw == '{"a": "wrong"}\n'
+    assert isinstance(e, LoadError)
+
+
+def test_load_iter_dead_letter_invalid_json(jv):
+    lines = '{"a": "2010-01-01"}\n{"a": \n{"a": "2010-01-03"}\n'
+    with pytest.raises(ValueError):
+        list(jv.load_iter(StringIO(lines), context=CONTEXT))
+    dead = []
+    loaded = jv.load_iter(
+        StringIO(lines), context=CONTEXT,
+        dead_letter=lambda index, raw, e: dead.append((index, raw, e)))
+    assert list(loaded) == [{'a': date(2010, 1, 1)}, {'a': date(2010, 1, 3)}]
+    [(index, raw, e)] = dead
+    assert index == 1
+    assert raw == '{"a": \n'
+    assert isinstance(e, ValueError)
+
+
+def test_load_iter_path_dead_letter_file(jv, tmpdir):
+    path = tmpdir.join('docs.json')
+    path.write(LINES)
+    f = StringIO()
+    loaded = jv.load_iter_path(str(path), context=CONTEXT,
+                               dead_letter=f)
+    assert len(list(loaded)) == 2
+    assert json.loads(f.getvalue()) == {
+        'index': 1,
+        'input': '{"a": "wrong"}',
+        'error': "http://jsonvalue.org/internal/id/a: u'wrong'",
+    }
+
+
+def test_dump_iter(jv):
+    f = StringIO()
+    jv.dump_iter([{'a': date(2010, 1, 1)}, {'a': date(2010, 1, 2)}],
+                 f, context=CONTEXT)
+    assert f.getvalue() == '{"a": "2010-01-01"}\n{"a": "2010-01-02"}\n'
+
+
+def test_dump_iter_dead_letter(jv):
+    objs = [{'a': date(2010, 1, 1)}, {'a': 'wrong'}, {'a': date(2010, 1, 3)}]
+    with pytest.raises(DumpError):
+        jv.dump_iter(objs, StringIO(), context=CONTEXT)
+    f = StringIO()
+    dead = []
+    jv.dump_iter(
+        objs, f, context=CONTEXT,
+        dead_letter=lambda index, raw, e: dead.append((index, raw)))
+    assert f.getvalue() == '{"a": "2010-01-01"}\n{"a": "2010-01-03"}\n'
+    assert dead == [(1, {'a': 'wrong'})]
@@ -0,0 +1,45 @@
+import json
+import subprocess
+import sys
+
+# generous, so this only fails if a heavy import sneaks back in;
+# importing jsonvalue takes about 15 ms, with pyld about 50 ms
+IMPORT_BUDGET = 0.25
+
+SCRIPT = '''
+import json, sys
+from timeit import default_timer
+start = default_timer()
+import jsonvalue, jsonvalue.schemaorg
+elapsed = default_timer() - start
+print(json.dumps({
+    'elapsed': elapsed,
+    'modules': sorted(name for name in sys.modules
+                      if name.split('.')[0] in ('pyld', 'isodate')),
+}))
+'''
+
+
+def run_import():
+    output = subprocess.check_output([sys.executable, '-c', SCRIPT])
+    return json.loads(output)
+
+
+def test_import_is_lazy():
+    result = run_import()
+    assert result['modules'] == []
+
+
+def test_import_budget():
+    # the best of a few runs, to not be thrown off by a busy machine
+    elapsed = min(run_import()['elapsed'] for i in range(3))
+    assert elapsed < IMPORT_BUDGET
+
+
+def test_lazy_module():
+    from jsonvalue.lazy import LazyModule
+
+    module = LazyModule('json')
+    assert module.dumps is json.dumps
+    # the attribute is now found without going through __getattr__
+    assert module.__dict__['dumps'] is json.dumps
@@ -0,0 +1,105 @@
+import pytest
+from StringIO import StringIO
+from jsonvalue import Limits, CustomNodeType
+from jsonvalue.error import LimitError, DepthError
+from jsonvalue.tests.util import CONTEXT
+from datetime import date
+
+
+def test_no_limits_exceeded(jv):
+    limits = Limits(max_bytes=100, max_nodes=2, max_depth=2, max_errors=0,
+                    timeout=60)
+    assert jv.loads('{"a": "2010-01-01", "sub": {"b": 3}}',
+                    context=CONTEXT, limits=limits) == {
+        'a': date(2010, 1, 1), 'sub': {'b': 3}}
+    assert jv.dumps({'a': date(2010, 1, 1)}, context=CONTEXT,
+                    limits=limits) == '{"a": "2010-01-01"}'
+
+
+def test_max_bytes(jv):
+    s = '{"a": "2010-01-01"}'
+    with pytest.raises(LimitError) as e:
+        jv.loads(s, context=CONTEXT, limits=Limits(max_bytes=len(s) - 1))
+    assert e.value.limit == 'max_bytes'
+    assert e.value.value == len(s) - 1
+
+    fp = StringIO(s)
+    with pytest.raises(LimitError):
+        jv.load(fp, context=CONTEXT, limits=Limits(max_bytes=4))
+    # only what is needed to know the limit is exceeded is read
+    assert fp.tell() == 5
+
+
+def test_max_nodes(jv):
+    d = {'sub': [{'b': 1}, {'b': 2}]}
+    with pytest.raises(LimitError) as e:
+        jv.load_objects(d, context=CONTEXT, limits=Limits(max_nodes=2))
+    assert e.value.limit == 'max_nodes'
+    with pytest.raises(LimitError):
+        jv.dump_objects(d, context=CONTEXT, limits=Limits(max_nodes=2))
+    limits = Limits(max_nodes=3)
+    assert jv.load_objects(d, context=CONTEXT, limits=limits) == d
+    assert jv.dump_objects(d, context=CONTEXT, limits=limits) == d
+
+
+def test_max_nodes_flat(jv):
+    with pytest.raises(LimitError):
+        jv.load_objects({'b': 1}, context=CONTEXT,
+                        limits=Limits(max_nodes=0))
+
+
+def test_max_nodes_dumped_objects(jv):
+    class User(object):
+        pass
+
+    user_node_type = CustomNodeType(
+        User, lambda user, extra: {'b': 1}, None, CONTEXT)
+    jv.node_type(user_node_type.id(), user_node_type)
+
+    # every dumped object is a node
+    with pytest.raises(LimitError):
+        jv.dump_objects({'sub': [User(), User()]}, context=CONTEXT,
+                        limits=Limits(max_nodes=2))
+
+
+def test_max_depth(jv):
+    d = {'sub': {'sub': {'b': 1}}}
+    with pytest.raises(DepthError) as e:
+        jv.load_objects(d, context=CONTEXT, limits=Limits(max_depth=2))
+    assert e.value.limit == 'max_depth'
+    with pytest.raises(DepthError):
+        jv.dump_objects(d, context=CONTEXT, limits=Limits(max_depth=2))
+    # it replaces the max_depth of the JsonValue for the call
+    jv.max_depth = 2
+    assert jv.load_objects(d, context=CONTEXT,
+                           limits=Limits(max_depth=3)) == d
+
+
+def test_max_errors(jv):
+    d = {'a': 'wrong', 'b': 'wrong', 'sub': {'b': 'wrong'}}
+    with pytest.raises(LimitError) as e:
+        jv.load_objects(d, context=CONTEXT, limits=Limits(max_errors=1))
+    assert e.value.limit == 'max_errors'
+    # a flat document goes through the specialized loader
+    with pytest.raises(LimitError):
+        jv.load_objects({'a': 'wrong', 'b': 'wrong'}, context=CONTEXT,
+                        limits=Limits(max_errors=1))
+    with pytest.raises(LimitError):
+        jv.dump_objects({'a': 'wrong', 'b': 'wrong'}, context=CONTEXT,
+                        limits=Limits(max_errors=1))
+
+
+def test_timeout(jv):
+    class User(object):
+        pass
+
+    user_node_type = CustomNodeType(
+        User, None, lambda d, extra: User(), CONTEXT)
+    jv.node_type(user_node_type.id(), user_node_type)
+
+    d = {'sub': [{'@type': user_node_type.id(), 'b': i} for i in range(10)]}
+    with pytest.raises(LimitError) as e:
+        jv.load_objects(d, context=CONTEXT, limits=Limits(timeout=0))
+    assert e.value.limit == 'timeout'
+    loaded = jv.load_objects(d, context=CONTEXT, limits=Limits(timeout=60))
+    assert len(loaded['sub']) == 10
@@ -0,0 +1,142 @@
+import bz2
+import json
+import pytest
+from jsonvalue.error import LineError
+from jsonvalue.parallel import convert_path, shard_ranges
+from jsonvalue.__main__ import main
+from jsonvalue.tests.util import CONTEXT, make_jv
+
+
+# unknown terms are dropped
+LINES = ''.join('{"a": "2010-01-%02d", "b": %d, "c": 1}\n' % (day, day)
+                for day in range(1, 21))
+
+
+def expected():
+    return ''.join('{"a": "2010-01-%02d", "b": %d}\n' % (day, day)
+                   for day in range(1, 21))
+
+
+def test_shard_ranges(tmpdir):
+    path = tmpdir.join('in.json')
+    path.write(LINES)
+    ranges = shard_ranges(str(path), 3)
+    assert len(ranges) == 3
+    assert ranges[0][0] == 0
+    assert ranges[-1][1] == len(LINES)
+    for (start, end), (next_start, next_end) in zip(ranges, ranges[1:]):
+        assert end == next_start
+        assert LINES[end - 1] == '\n'
+
+
+def test_shard_ranges_more_shards_than_lines(tmpdir):
+    path = tmpdir.join('in.json')
+    path.write('{"a": "2010-01-01"}\n{"a": "2010-01-02"}')
+    ranges = shard_ranges(str(path), 10)
+    assert len(ranges) == 2
+    assert ranges[-1][1] == len(path.read())
+
+
+def test_shard_ranges_empty(tmpdir):
+    path = tmpdir.join('in.json')
+    path.write('')
+    assert shard_ranges(str(path), 3) == []
+
+
+def test_convert_path(tmpdir):
+    path = tmpdir.join('in.json')
+    path.write(LINES)
+    output = tmpdir.join('out.json')
+    assert convert_path(make_jv, str(path), str(output),
+                        CONTEXT, processes=1,
+                        shards=4) == [str(output)]
+    assert output.read() == expected()
+    assert sorted(tmpdir.listdir()) == [path, output]
+
+
+def test_convert_path_processes(tmpdir):
+    path = tmpdir.join('in.json')
+    path.write(LINES)
+    output = tmpdir.join('out.json')
+    convert_path('jsonvalue.tests.util:make_jv', str(path),
+                 str(output), CONTEXT, processes=2,
+                 shards=5)
+    assert output.read() == expected()
+
+
+def test_convert_path_no_merge(tmpdir):
+    path = tmpdir.join('in.json')
+    path.write(LINES)
+    output = str(tmpdir.join('out.json'))
+    shard_paths = convert_path(make_jv, str(path), output, CONTEXT,
+                               processes=1, shards=2, merge=False)
+    assert shard_paths == [output + '.0', output + '.1']
+    assert ''.join(open(p).read() for p in shard_paths) == expected()
+
+
+def test_convert_path_error(tmpdir):
+    path = tmpdir.join('in.json')
+    path.write('{"a": "2010-01-01"}\n\n{"a": "wrong"}\n')
+    with pytest.raises(LineError) as e:
+        convert_path(make_jv, str(path), str(tmpdir.join('out.json')),
+                     CONTEXT, processes=2, shards=2)
+    assert e.value.offset == 21
+    assert str(e.value) == (
+        "line at byte offset 21: http://jsonvalue.org/internal/id/a: "
+        "u'wrong'")
+    # no partial output is left behind
+    assert tmpdir.listdir() == [path]
+
+
+def test_main(tmpdir, capsys):
+    path = tmpdir.join('in.json')
+    path.write(LINES)
+    output = tmpdir.join('out.json')
+    assert main([str(path), str(output),
+                 '--factory', 'jsonvalue.tests.util:make_jv',
+                 '--load-context', 'jsonvalue.tests.test_parallel:CONTEXT',
+                 '-j', '2']) == 0
+    assert output.read() == expected()
+
+    path.write('nonsense\n')
+    assert main([str(path), str(output),
+                 '--factory', 'jsonvalue.tests.util:make_jv',
+                 '-j', '1']) == 1
+    assert 'line at byte offset 0' in capsys.readouterr()[1]
+
+
+def test_convert_path_dead_letter(tmpdir):
+    path = tmpdir.join('in.json')
+    path.write('{"a": "2010-01-01"}\n{"a": "wrong"}\n' * 3)
+    output = tmpdir.join('out.json')
+    dead_letter = tmpdir.join('dead.json')
+    assert convert_path(make_jv, str(path), str(output), CONTEXT,
+                        processes=2, shards=3,
+                        dead_letter=str(dead_letter)) == [
+        str(output), str(dead_letter)]
+    assert output.read() == '{"a": "2010-01-01"}\n' * 3
+    dead = [json.loads(line) for line in dead_letter.readlines()]
+    assert [entry['offset'] for entry in dead] == [20, 55, 90]
+    assert dead[0]['input'] == '{"a": "wrong"}'
+    assert sorted(tmpdir.listdir()) == [dead_letter, path, output]
+
+
+def test_convert_path_dead_letter_invalid_json(tmpdir):
+    path = tmpdir.join('in.json')
+    path.write('{"a": "2010-01-01"}\n{"a": \n' * 3)
+    output = tmpdir.join('out.json')
+    dead_letter = tmpdir.join('dead.json')
+    convert_path(make_jv, str(path), str(output), CONTEXT,
+                 processes=2, shards=3, dead_letter=str(dead_letter))
+    assert output.read() == '{"a": "2010-01-01"}\n' * 3
+    dead = [json.loads(line) for line in dead_letter.readlines()]
+    assert [entry['offset'] for entry in dead] == [20, 47, 74]
+    assert dead[0]['input'] == '{"a": '
+
+
+def test_convert_path_compressed(tmpdir):
+    path = tmpdir.join('in.json.bz2')
+    path.write(bz2.compress(LINES), 'wb')
+    with pytest.raises(ValueError):
+        convert_path(make_jv, str(path), str(tmpdir.join('out.json')),
+                     CONTEXT, processes=1)
@@ -0,0 +1,46 @@
+from StringIO import StringIO
+from jsonvalue.tests.util import CONTEXT
+from datetime import date
+import pytest
+
+
+LINES = '{"a": "2010-01-01"}\n\n{"a": "2010-01-02"}\r\n{"a": "2010-01-03"}'
+
+
+def test_load_path(jv, tmpdir):
+    path = tmpdir.join('doc.json')
+    path.write('{"a": "2010-01-01"}')
+    assert jv.load_path(str(path), context=CONTEXT) == {
+        'a': date(2010, 1, 1)}
+
+
+def test_load_path_empty(jv, tmpdir):
+    path = tmpdir.join('doc.json')
+    path.write('')
+    with pytest.raises(ValueError):
+        jv.load_path(str(path), context=CONTEXT)
+
+
+def test_load_iter(jv):
+    assert list(jv.load_iter(StringIO(LINES), context=CONTEXT)) == [
+        {'a': date(2010, 1, 1)},
+        {'a': date(2010, 1, 2)},
+        {'a': date(2010, 1, 3)},
+    ]
+
+
+def test_load_iter_path(jv, tmpdir):
+    path = tmpdir.join('docs.json')
+    path.write(LINES)
+    loaded = jv.load_iter_path(str(path), context=CONTEXT)
+    assert next(loaded) == {'a': date(2010, 1, 1)}
+    assert list(loaded) == [
+        {'a': date(2010, 1, 2)},
+        {'a': date(2010, 1, 3)},
+    ]
+
+
+def test_load_iter_path_empty(jv, tmpdir):
+    path = tmpdir.join('docs.json')
+    path.write('')
+    assert list(jv.load_iter_path(str(path))) == []
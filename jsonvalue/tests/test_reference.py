@@ -0,0 +1,106 @@
+import json
+import pytest
+from StringIO import StringIO
+from pyld import jsonld
+from jsonvalue import Stats
+from jsonvalue.error import FrozenError
+from jsonvalue.tests.util import CONTEXT
+from datetime import date
+
+
+URL = 'http://example.com/context.jsonld'
+
+
+@pytest.fixture
+def no_retrieval(request):
+    # registered contexts must never be retrieved
+    def fail(url):
+        raise AssertionError("Retrieved %s" % url)
+    loader = jsonld.get_document_loader()
+    jsonld.set_document_loader(fail)
+    request.addfinalizer(lambda: jsonld.set_document_loader(loader))
+
+
+@pytest.fixture
+def jv(jv):
+    jv.context_url(URL, CONTEXT)
+    return jv
+
+
+def test_dump_reference_context(jv, no_retrieval):
+    d = {'a': date(2010, 1, 1)}
+    assert jv.dump_objects(d, CONTEXT, reference_context=True) == {
+        '@context': URL, 'a': '2010-01-01'}
+    # an inline context is replaced as well
+    d = {'@context': CONTEXT, 'a': date(2010, 1, 1)}
+    assert jv.dump_objects(d, reference_context=True) == {
+        '@context': URL, 'a': '2010-01-01'}
+    assert jv.dumps({'a': date(2010, 1, 1)}, context=CONTEXT,
+                    reference_context=True) == (
+        '{"a": "2010-01-01", "@context": "%s"}' % URL)
+
+
+def test_dump_reference_context_nothing_to_convert(jv):
+    jv.context_url('http://example.com/plain', {'b': 'http://example.com/b'})
+    d = {'b': 1}
+    assert jv.dump_objects(d, {'b': 'http://example.com/b'},
+                           reference_context=True) == {
+        '@context': 'http://example.com/plain', 'b': 1}
+    assert d == {'b': 1}
+
+
+def test_dump_reference_context_file(jv, no_retrieval):
+    f = StringIO()
+    jv.dump({'a': date(2010, 1, 1)}, f, context=CONTEXT,
+            reference_context=True)
+    assert json.loads(f.getvalue()) == {'@context': URL, 'a': '2010-01-01'}
+
+
+def test_dump_reference_context_list(jv):
+    jv.context_url('http://example.com/plain', {'b': 'http://example.com/b'})
+    # a list has no place for a context
+    assert jv.dump_objects([1, 2], {'b': 'http://example.com/b'},
+                           reference_context=True) == [1, 2]
+
+
+def test_dump_reference_context_unregistered(jv):
+    with pytest.raises(ValueError):
+        jv.dump_objects({'b': 1}, {'b': 'http://example.com/b'},
+                        reference_context=True)
+
+
+def test_load_by_reference(jv, no_retrieval):
+    stats = Stats()
+    assert jv.loads('{"@context": "%s", "a": "2010-01-01"}' % URL,
+                    stats=stats) == {'@context': URL, 'a': date(2010, 1, 1)}
+    # the registered context can be specialized
+    assert set(stats.timings) == set(['specialized'])
+
+
+def test_load_nested_by_reference(jv, no_retrieval):
+    s = '{"@context": "%s", "sub": {"a": "2010-01-01"}}' % URL
+    assert jv.loads(s) == {'@context': URL, 'sub': {'a': date(2010, 1, 1)}}
+
+
+def test_roundtrip(jv, no_retrieval):
+    sub = [{'a': date(2010, 1, 1)}, {'a': date(2010, 1, 2)}]
+    s = jv.dumps({'sub': sub}, context=CONTEXT, reference_context=True)
+    loaded = jv.loads(s)
+    assert loaded == {'@context': URL, 'sub': sub}
+    # what is loaded by reference dumps by reference
+    assert json.loads(jv.dumps(loaded)) == json.loads(s)
+
+
+def test_context_argument_by_reference(jv, no_retrieval):
+    assert jv.loads('{"a": "2010-01-01"}', context=URL) == {
+        'a': date(2010, 1, 1)}
+    assert jv.dumps({'a': date(2010, 1, 1)}, context=URL) == (
+        '{"a": "2010-01-01"}')
+
+
+def test_frozen(jv, no_retrieval):
+    frozen = jv.freeze()
+    assert frozen.loads('{"@context": "%s", "a": "2010-01-01"}' % URL) == {
+        '@context': URL, 'a': date(2010, 1, 1)}
+    with pytest.raises(FrozenError):
+        frozen.context_url('http://example.com/other', {})
@@ -0,0 +1,89 @@
+from jsonvalue import JsonValue, Metrics, valuetypes, schemaorg, error
+from jsonvalue.specialize import SpecializedLoader
+from datetime import date
+import pytest
+
+
+CONTEXT = valuetypes(dict(
+    a=schemaorg.Boolean,
+    d=schemaorg.Integer,
+    g=schemaorg.Date,
+    x='http://example.com/unknown',
+))
+CONTEXT['plain'] = 'http://example.com/plain'
+
+
+def generic_and_specialized():
+    specialized = JsonValue()
+    specialized.value_vocabulary(schemaorg.DATA_TYPE_VOCABULARY)
+    # metrics are only recorded on the generic path
+    generic = JsonValue(metrics=Metrics())
+    generic.value_vocabulary(schemaorg.DATA_TYPE_VOCABULARY)
+    return generic, specialized
+
+
+@pytest.mark.parametrize('d', [
+    {},
+    {'a': True, 'd': 3, 'g': '2010-01-01', 'x': 'foo', 'plain': 1.5},
+    {'a': None, 'g': '2010-01-01'},
+    {'@context': CONTEXT, 'g': '2010-01-01', 'plain': u'foo'},
+    {'g': '2010-01-01', 'other': 'dropped'},
+    {'g': '2010-01-01', 'plain': [1, 2]},
+    {'g': '2010-01-01', 'plain': {'a': True}},
+])
+def test_specialized_same_as_generic(d):
+    generic, specialized = generic_and_specialized()
+    assert (specialized.load_objects(dict(d), context=CONTEXT) ==
+            generic.load_objects(dict(d), context=CONTEXT))
+
+
+@pytest.mark.parametrize('d', [
+    {'a': 'wrong', 'd': 1.1, 'g': '2010-14-01'},
+    {'x': 'foo', 'plain': 'bar'},
+])
+def test_specialized_errors_same_as_generic(d):
+    generic, specialized = generic_and_specialized()
+    with pytest.raises(error.LoadError) as e:
+        generic.load_objects(d, context=CONTEXT, reject_unknown=True)
+    generic_errors = [(err.term, err.type, err.value)
+                      for err in e.value.errors]
+    with pytest.raises(error.LoadError) as e:
+        specialized.load_objects(d, context=CONTEXT, reject_unknown=True)
+    specialized_errors = [(err.term, err.type, err.value)
+                          for err in e.value.errors]
+    assert specialized_errors == generic_errors
+
+
+def test_specialized_loader():
+    jv = JsonValue()
+    jv.value_vocabulary(schemaorg.DATA_TYPE_VOCABULARY)
+
+    loader = jv.specialized_loader(CONTEXT)
+    assert isinstance(loader, SpecializedLoader)
+    assert 'load_' in loader.source
+    # cached
+    assert jv.specialized_loader(CONTEXT) is loader
+    # and shared between instances with the same types
+    other = JsonValue()
+    other.value_vocabulary(schemaorg.DATA_TYPE_VOCABULARY)
+    assert other.specialized_loader(CONTEXT) is loader
+
+    # a context with anything else than plain terms is not specialized
+    assert jv.specialized_loader({'@vocab': 'http://example.com/'}) is None
+
+
+def test_specialized_loader_invalidated():
+    jv = JsonValue()
+    context = valuetypes(dict(g=schemaorg.Date))
+
+    loader = jv.specialized_loader(context)
+    assert jv.load_objects({'g': '2010-01-01'}, context=context) == {
+        'g': '2010-01-01'}
+
+    jv.value_type(schemaorg.Text.id(), schemaorg.Text)
+    assert jv.specialized_loader(context) is loader
+
+    jv.value_type(schemaorg.Date.id(), schemaorg.Date)
+    assert jv.specialized_loader(context) is not loader
+    assert jv.load_objects({'g': '2010-01-01'}, context=context) == {
+        'g': date(2010, 1, 1)}
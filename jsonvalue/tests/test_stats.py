@@ -0,0 +1,102 @@
+import pytest
+from jsonvalue import JsonValue, valuetypes, schemaorg
+from jsonvalue import Stats, Metrics, CustomNodeType, error
+from datetime import date
+
+
+def test_load_stats():
+    jv = JsonValue()
+    jv.value_vocabulary(schemaorg.DATA_TYPE_VOCABULARY)
+
+    stats = Stats()
+    s = '{"a": "2010-01-01", "sub": {"b": 3}}'
+    context = valuetypes(dict(a=schemaorg.Date, b=schemaorg.Integer))
+    context['sub'] = 'http://example.com/sub'
+    values = jv.loads(s, context=context, stats=stats)
+
+    assert values == {'a': date(2010, 1, 1), 'sub': {'b': 3}}
+    # the specialized loader does not handle nested documents, so this
+    # falls back to the generic path
+    assert set(stats.timings) == set(
+        ['specialized', 'expand', 'transform', 'compact', 'realize'])
+    assert stats.values == 2
+    # the wrapper node, the document and the sub node
+    assert stats.nodes == 3
+    assert stats.bytes_in == len(s)
+    assert stats.bytes_out == 0
+
+
+def test_dump_stats():
+    jv = JsonValue()
+    jv.value_vocabulary(schemaorg.DATA_TYPE_VOCABULARY)
+
+    stats = Stats()
+    s = jv.dumps({'a': date(2010, 1, 1)},
+                 context=valuetypes(dict(a=schemaorg.Date)),
+                 stats=stats)
+
+    assert s == '{"a": "2010-01-01"}'
+    assert set(stats.timings) == set(
+        ['dump', 'expand', 'transform', 'compact'])
+    assert stats.values == 1
+    # the wrapper node and the document
+    assert stats.nodes == 2
+    assert stats.bytes_in == 0
+    assert stats.bytes_out == len(s)
+
+
+def test_no_stats():
+    jv = JsonValue()
+    jv.value_vocabulary(schemaorg.DATA_TYPE_VOCABULARY)
+    context = valuetypes(dict(a=schemaorg.Date))
+
+    assert jv.loads('{"a": "2010-01-01"}', context=context) == {
+        'a': date(2010, 1, 1)}
+    assert jv.dumps({'a': date(2010, 1, 1)},
+                    context=context) == '{"a": "2010-01-01"}'
+
+
+def test_metrics():
+    metrics = Metrics()
+    jv = JsonValue(metrics=metrics)
+    jv.value_vocabulary(schemaorg.DATA_TYPE_VOCABULARY)
+
+    class User(object):
+        def __init__(self, name):
+            self.name = name
+
+    context = valuetypes(dict(name=schemaorg.Text, d=schemaorg.Date))
+    user_node_type = CustomNodeType(
+        User,
+        lambda user, extra: {'name': user.name},
+        lambda d, extra: User(d['name']),
+        context)
+    jv.node_type(user_node_type.id(), user_node_type)
+
+    user = jv.load_objects({'@type': user_node_type.id(), 'name': 'foo'},
+                           context=context)
+    jv.dump_objects(user, context=context)
+    with pytest.raises(error.LoadError):
+        jv.load_objects({'d': 'wrong'}, context=context)
+
+    snapshot = metrics.snapshot()
+    assert sorted(snapshot) == [
+        'dump_node', 'dump_value', 'load_node', 'load_value']
+    text = schemaorg.Text.id()
+    assert snapshot['load_value'][text]['count'] == 1
+    assert snapshot['load_value'][text]['failures'] == 0
+    assert snapshot['dump_value'][text]['count'] == 1
+    assert snapshot['load_node'][user_node_type.id()]['count'] == 1
+    assert snapshot['dump_node'][user_node_type.id()]['count'] == 1
+    date_entry = snapshot['load_value'][schemaorg.Date.id()]
+    assert date_entry['count'] == 1
+    assert date_entry['failures'] == 1
+    assert date_entry['time'] >= 0.0
+
+    # snapshots are copies
+    date_entry['count'] = 100
+    assert metrics.snapshot()['load_value'][schemaorg.Date.id()][
+        'count'] == 1
+
+    metrics.reset()
+    assert metrics.snapshot() == {}
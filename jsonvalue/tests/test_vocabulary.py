@@ -0,0 +1,129 @@
+from jsonvalue import JsonValue, CustomNodeType, valuetypes, schemaorg
+from jsonvalue.vocabulary import LazyVocabulary
+from jsonvalue.error import FrozenError
+from datetime import date
+import pytest
+
+
+def test_lazy_vocabulary():
+    created = []
+
+    def factory(iri):
+        created.append(iri)
+        if iri == schemaorg.Date.id():
+            return schemaorg.Date
+        return None
+
+    vocabulary = LazyVocabulary(factory)
+    assert len(vocabulary) == 0
+    assert vocabulary.get(schemaorg.Date.id()) is schemaorg.Date
+    assert vocabulary.get(schemaorg.Date.id()) is schemaorg.Date
+    assert vocabulary.get('http://example.com/unknown') is None
+    assert created == [schemaorg.Date.id(), 'http://example.com/unknown']
+    assert len(vocabulary) == 1
+
+
+def test_lazy_value_vocabulary():
+    jv = JsonValue()
+    jv.value_vocabulary(schemaorg.VOCABULARY)
+    # nothing is registered up front
+    assert jv._iri_to_value_type == {}
+
+    context = valuetypes(dict(a=schemaorg.Date, b=schemaorg.Integer))
+    assert jv.load_objects({'a': '2010-01-01', 'b': 1},
+                           context=context) == {'a': date(2010, 1, 1), 'b': 1}
+    assert jv.dump_objects({'a': date(2010, 1, 1)}, context=context) == {
+        'a': '2010-01-01'}
+    assert sorted(jv._iri_to_value_type) == [
+        schemaorg.Date.id(), schemaorg.Integer.id()]
+
+
+def test_lazy_value_vocabulary_generic_path():
+    jv = JsonValue()
+    jv.value_vocabulary(schemaorg.VOCABULARY)
+    context = valuetypes(dict(a=schemaorg.Date))
+    context['sub'] = 'http://example.com/sub'
+
+    assert jv.load_objects({'sub': {'a': '2010-01-01'}}, context=context) == {
+        'sub': {'a': date(2010, 1, 1)}}
+    assert jv.can_load_value(schemaorg.Time.id())
+    assert not jv.can_load_value('http://example.com/unknown')
+
+
+def test_schemaorg_created_data_types():
+    xpath = 'http://schema.org/XPathType'
+    t = schemaorg.VOCABULARY.get(xpath)
+    assert t.id() == xpath
+    assert issubclass(t, schemaorg.Text)
+    assert schemaorg.VOCABULARY.get(xpath) is t
+    assert schemaorg.VOCABULARY.get('http://schema.org/Unknown') is None
+    # node types are not part of it
+    assert schemaorg.VOCABULARY.get('http://schema.org/Person') is None
+    assert schemaorg.VOCABULARY.get('http://example.com/Date') is None
+
+
+def test_schemaorg_all_data_types():
+    # http://schema.org/DataType and its subtypes
+    names = ['DataType', 'Boolean', 'Date', 'DateTime', 'Number', 'Float',
+             'Integer', 'Text', 'CssSelectorType', 'PronounceableText',
+             'URL', 'XPathType', 'Time']
+    for name in names:
+        t = schemaorg.VOCABULARY.get('http://schema.org/%s' % name)
+        assert issubclass(t, schemaorg.DataType)
+
+
+def test_lazy_node_vocabulary():
+    class User(object):
+        def __init__(self, name):
+            self.name = name
+
+    context = {'name': 'http://example.com/name'}
+    user_node_type = CustomNodeType(
+        User,
+        lambda user, extra: {'name': user.name},
+        lambda d, extra: User(d['name']),
+        context)
+
+    def factory(iri):
+        if iri == user_node_type.id():
+            return user_node_type
+        return None
+
+    def iri(cls):
+        if cls is User:
+            return user_node_type.id()
+        return None
+
+    vocabulary = LazyVocabulary(factory, iri)
+    jv = JsonValue()
+    jv.node_vocabulary(vocabulary)
+
+    # dumping finds the node type by class
+    dumped = jv.dump_objects(User('foo'), context=context)
+    assert dumped == {'@type': user_node_type.id(), 'name': 'foo'}
+    loaded = jv.load_objects(dumped, context=context)
+    assert isinstance(loaded, User)
+    assert loaded.name == 'foo'
+
+
+def test_lazy_vocabulary_frozen():
+    jv = JsonValue()
+    jv.value_vocabulary(schemaorg.VOCABULARY)
+    frozen = jv.freeze()
+    context = valuetypes(dict(a=schemaorg.Date))
+    context['sub'] = 'http://example.com/sub'
+
+    assert frozen.load_objects({'sub': {'a': '2010-01-01'}},
+                               context=context) == {
+        'sub': {'a': date(2010, 1, 1)}}
+    assert frozen.dump_objects({'a': date(2010, 1, 1)}, context=context) == {
+        'a': '2010-01-01'}
+    # the original is not affected
+    assert jv._iri_to_value_type == {}
+
+    with pytest.raises(FrozenError):
+        frozen.value_vocabulary(schemaorg.VOCABULARY)
+    with pytest.raises(FrozenError):
+        frozen.node_vocabulary(LazyVocabulary(lambda iri: None))
+    with pytest.raises(FrozenError):
+        frozen.value_vocabulary(schemaorg.DATA_TYPE_VOCABULARY)
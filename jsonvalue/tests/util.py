@@ -0,0 +1,14 @@
+from jsonvalue import JsonValue, valuetypes, schemaorg
+
+
+# value types for a few terms, and a term for nested documents
+CONTEXT = valuetypes(dict(a=schemaorg.Date, b=schemaorg.Integer))
+CONTEXT['sub'] = 'http://example.com/sub'
+
+
+def make_jv():
+    """Return a JsonValue that knows the schema.org data types.
+    """
+    jv = JsonValue()
+    jv.value_vocabulary(schemaorg.DATA_TYPE_VOCABULARY)
+    return jv
@@ -0,0 +1,55 @@
+import threading
+
+
+class LazyVocabulary(object):
+    """A vocabulary of types that are created on first lookup.
+
+    ``factory`` is called with a type IRI and returns the type for it,
+    or ``None`` if the vocabulary has no such type. It is called for
+    every IRI looked up that is not known yet, so it should be cheap
+    for IRIs outside the vocabulary. Types it returns are kept, so the
+    vocabulary only holds on to the types actually used.
+
+    For a vocabulary of node types, ``iri`` is a function that takes a
+    class and returns the type IRI of its node type, or ``None``. This
+    makes it possible to dump objects of a node type that has not been
+    looked up yet.
+
+    Pass a lazy vocabulary to :meth:`jsonvalue.JsonValue.value_vocabulary`
+    or :meth:`jsonvalue.JsonValue.node_vocabulary`.
+    """
+    def __init__(self, factory, iri=None):
+        self._factory = factory
+        self._iri = iri
+        self._lock = threading.Lock()
+        self._types = {}
+
+    def get(self, iri):
+        """Return the type for iri, or ``None``.
+        """
+        t = self._types.get(iri)
+        if t is not None:
+            return t
+        t = self._factory(iri)
+        if t is None:
+            return None
+        with self._lock:
+            # another thread may have been first
+            return self._types.setdefault(iri, t)
+
+    def get_for_class(self, cls):
+        """Return ``(iri, type)`` of the node type for cls, or ``None``.
+        """
+        if self._iri is None:
+            return None
+        iri = self._iri(cls)
+        if iri is None:
+            return None
+        t = self.get(iri)
+        if t is None or t.cls is not cls:
+            return None
+        return iri, t
+
+    def __len__(self):
+        # the amount of types created so far
+        return len(self._types)